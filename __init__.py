@@ -3,15 +3,37 @@
 # OFFICE --------> Senior VFX Compositor, Software Developer
 # WEBSITE -------> https://vinavfx.com
 # -----------------------------------------------------------
+from time import time
+
+import_start = time()
+
 import os
 import nuke  # type: ignore
-from .src import *
+from . import src
+from .src import startup
 from .testing import *
 from functools import partial
 from .settings import UPDATE_MENU_AT_START, COMFYUI2NUKE
 
 
+def __getattr__(name):
+    # comfyui.cmd, comfyui.update_menu, ... are imported on first use
+    return getattr(src, name)
+
+
+def call(path, *args, **kwargs):
+    # menu commands resolve their module only when they are run
+    func = src
+    for name in path.split("."):
+        func = getattr(func, name)
+
+    return func(*args, **kwargs)
+
+
 def setup():
+    setup_start = time()
+    startup.profile("register_callbacks", call, "common.register_callbacks")
+
     icon = "{}/icons/comfyui_icon.png".format(COMFYUI2NUKE)
     comfyui_menu = nuke.menu("Nodes").addMenu("ComfyUI", icon=icon)
 
@@ -24,10 +46,15 @@ def setup():
     gizmos_icon = "{}/icons/gizmos.png".format(COMFYUI2NUKE)
     scripts_icon = "{}/icons/scripts.png".format(COMFYUI2NUKE)
 
-    comfyui_menu.addCommand("Update all ComfyUI", update_menu.update, "", refresh_icon)
+    comfyui_menu.addCommand(
+        "Update all ComfyUI", partial(call, "update_menu.update"), "", refresh_icon
+    )
 
     comfyui_menu.addCommand(
-        "Import Workflow", workflow_importer.import_workflow, "", workflow_icon
+        "Import Workflow",
+        partial(call, "workflow_importer.import_workflow"),
+        "",
+        workflow_icon,
     )
 
     comfyui_menu.addMenu("Basic Nodes", basic_icon)
@@ -38,42 +65,39 @@ def setup():
         node = nuke.nodePaste(os.path.join(nodes_dir, nk))
         node.showControlPanel()
 
-    for dirname in os.listdir(nodes_dir):
-        folder = os.path.join(nodes_dir, dirname)
-
-        if not os.path.isdir(folder):
-            continue
-
-        for nk in os.listdir(folder):
-            if not nk.split(".")[-1] == "nk":
-                continue
-
-            name = "{}/{}".format(
-                "Basic Nodes" if dirname == "ComfyUI" else dirname, nk.split(".")[0]
-            )
-
-            path_nk = os.path.join(folder, nk)
-            comfyui_menu.addCommand(name, partial(create_node, path_nk), "", icon_gray)
+    for name, path_nk in startup.profile("list_nodes", startup.list_nodes, nodes_dir):
+        comfyui_menu.addCommand(name, partial(create_node, path_nk), "", icon_gray)
 
     comfyui_menu.addCommand(
-        "Scripts/knob2input", scripts.knob2input.knob_to_input, icon=icon_gray
+        "Scripts/knob2input",
+        partial(call, "scripts.knob2input.knob_to_input"),
+        icon=icon_gray,
     )
 
     comfyui_menu.addCommand(
         "Scripts/forceOutput",
-        scripts.force_output_connection.force_output,
+        partial(call, "scripts.force_output_connection.force_output"),
         icon=icon_gray,
     )
 
     comfyui_menu.addCommand(
         "Scripts/exportWorkflow",
-        scripts.export_workflow.export_workflow,
+        partial(call, "scripts.export_workflow.export_workflow"),
         icon=icon_gray,
     )
 
     comfyui_menu.addCommand(
-        "Scripts/executeRuns", execute_runs.execute_runs, "Ctrl+R", icon=icon_gray
+        "Scripts/executeRuns",
+        partial(call, "execute_runs.execute_runs"),
+        "Ctrl+R",
+        icon=icon_gray,
     )
 
     if UPDATE_MENU_AT_START:
-        update_menu.update()
+        startup.profile("update_menu", call, "update_menu.update", use_cache=True)
+
+    startup.timings["setup"] = time() - setup_start
+    startup.finish(src.modules)
+
+
+startup.timings["import"] = time() - import_start
@@ -6,9 +6,27 @@ URL =                               os.getenv('NUKE_COMFYUI_URL', '0.0.0.0:8188'
 COMFYUI2NUKE =                      os.path.dirname(__file__)
 COMFYUI_LOCAL =                     bool(int(os.getenv('COMFYUI_LOCAL', '1')))
 OUTPUT_DIRECTORY =                  os.getenv('OUTPUT_DIRECTORY', '')
+PROFILE_STARTUP =                   bool(int(os.getenv('NUKE_COMFYUI_PROFILE_STARTUP', '0')))
 
 # SETTINGS
 UPDATE_MENU_AT_START = False
 USE_EXR_TO_LOAD_IMAGES = False
 DISPLAY_META_IN_READ_NODE = True
 TEMPORAL_DIR = os.path.join(os.path.expanduser("~"), ".nuke", "comfyui_temp")
+HTTP_POOL_SIZE = 8
+SERVER_STATUS_TTL = 2.0
+SERVER_STATUS_BACKGROUND_REFRESH = True
+SERVER_WEIGHTS = {}
+MODEL_AFFINITY_TOLERANCE = 0.8
+WS_RECONNECT_ATTEMPTS = 5
+CANCEL_POLL_INTERVAL = 0.5
+HTTP_RETRIES = 3
+HTTP_RETRY_BACKOFF = 0.5
+CIRCUIT_BREAKER_FAILURES = 3
+CIRCUIT_BREAKER_RESET = 30
+SYSTEM_STATS_TTL = 30
+STARTUP_BUDGET = 0.1
+RENDER_WORKERS = 0
+RENDER_MIN_FRAMES = 48
+INPUT_STORE_MAX_SIZE = 20 * 1024**3
+STATE_STORE_MAX_ENTRIES = 1000
@@ -1,14 +1,38 @@
-from . import (
-    common,
-    connection,
-    nodes,
-    run,
-    update_menu,
-    read_media,
-    upload_and_download,
-    workflow_importer,
-    execute_runs,
-    scripts,
-    queue_manager,
-    cmd,
-)
+from importlib import import_module
+
+# submodules are imported on first use, so Nuke startup only pays for what setup() needs
+modules = [
+    "common",
+    "connection",
+    "metrics",
+    "client",
+    "nodes",
+    "fingerprint",
+    "render",
+    "input_store",
+    "state_store",
+    "catalog",
+    "run",
+    "update_menu",
+    "read_media",
+    "upload_and_download",
+    "workflow_importer",
+    "execute_runs",
+    "scripts",
+    "queue_manager",
+    "server_status",
+    "scheduler",
+    "cmd",
+    "startup",
+]
+
+
+def __getattr__(name):
+    if not name in modules:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+    return import_module("." + name, __name__)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(modules))
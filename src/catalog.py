@@ -0,0 +1,240 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import json
+import hashlib
+import threading
+
+from .connection import request, get_base_url
+from .common import show_message, get_name_code, save_json
+
+# One object_info catalog per session, shared by the menu and the prompt builder.
+# class_type -> normalized object_info entry
+nodes = {}
+# menu path -> class_type
+menu_items = {}
+# class_type -> md5 of the normalized entry, used to diff catalog refreshes
+hashes = {}
+
+default_image_inputs = ["image", "frames", "pixels", "images", "src_images"]
+default_mask_inputs = ["mask", "attn_mask", "mask_optional"]
+image_inputs = set(default_image_inputs)
+mask_inputs = set(default_mask_inputs)
+image_and_mask_inputs = image_inputs | mask_inputs
+
+# validated once the loaded catalog is known to match the server this session
+state = {"loaded": False, "fingerprint": "", "validated": False}
+catalog_lock = threading.RLock()
+
+
+def normalize_string(string):
+    if not string:
+        return ""
+
+    string = "".join(char if ord(char) < 128 else "" for char in string)
+    return string.replace(" /", "/").replace("/ ", "/").strip()
+
+
+def normalize_entry(value):
+    value["display_name"] = value.get("display_name") or value.get("name")
+    display_name = normalize_string(value["display_name"])
+    category = normalize_string(value["category"])
+
+    if not category:
+        category = "Uncategorized"
+
+    value["category"] = category
+
+    input_data = value.get("input", {})
+    order = value.get("input_order", {})
+
+    if not order:
+        value["input_order"] = {
+            "required": list(input_data.get("required", {})),
+            "optional": list(input_data.get("optional", {})),
+        }
+
+    item_name = "{}/{}".format(category, display_name)
+    return item_name, value
+
+
+def entry_hash(value):
+    data = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.md5(data.encode("utf-8")).hexdigest()
+
+
+def index_entry(class_type, value):
+    input_data = value.get("input", {})
+    required = input_data.get("required", {})
+    optional = input_data.get("optional", {})
+
+    for name, _input in list(required.items()) + list(optional.items()):
+        input_class = _input[0]
+
+        if input_class in ["*", "IMAGE"]:
+            image_inputs.add(name)
+            image_and_mask_inputs.add(name)
+
+        if input_class in ["*", "MASK"]:
+            mask_inputs.add(name)
+            image_and_mask_inputs.add(name)
+
+    hashes[class_type] = entry_hash(value)
+
+
+def set_info(info, fingerprint="", validated=False):
+    # the containers are refilled in place, so references to them stay valid
+    with catalog_lock:
+        nodes.clear()
+        menu_items.clear()
+        hashes.clear()
+
+        image_inputs.clear()
+        image_inputs.update(default_image_inputs)
+        mask_inputs.clear()
+        mask_inputs.update(default_mask_inputs)
+        image_and_mask_inputs.clear()
+        image_and_mask_inputs.update(image_inputs | mask_inputs)
+
+        for _, value in info.items():
+            item_name, value = normalize_entry(value)
+            class_type = value["name"]
+
+            nodes[class_type] = value
+            menu_items[item_name] = class_type
+            index_entry(class_type, value)
+
+        state["loaded"] = True
+        state["fingerprint"] = fingerprint
+        state["validated"] = validated
+
+
+def patch_entry(class_type, value):
+    # patched in place, anything holding the entry sees the new data
+    with catalog_lock:
+        item_name, value = normalize_entry(value)
+
+        if class_type in nodes:
+            nodes[class_type].clear()
+            nodes[class_type].update(value)
+        else:
+            nodes[class_type] = value
+
+        menu_items[item_name] = class_type
+        index_entry(class_type, value)
+
+        return nodes[class_type]
+
+
+def is_image_input(name):
+    return name in image_inputs
+
+
+def is_mask_input(name):
+    return name in mask_inputs
+
+
+def is_image_or_mask_input(name):
+    return name in image_and_mask_inputs
+
+
+def get_catalog_path(settings):
+    return os.path.join(
+        settings["TEMPORAL_DIR"],
+        "object_info",
+        "{}.json".format(get_name_code(get_base_url(settings))),
+    )
+
+
+def fetch_object_info(settings, warning=True, class_type=None, timeout=30):
+    endpoint = "object_info/{}".format(class_type) if class_type else "object_info"
+
+    try:
+        response = request(
+            "GET",
+            endpoint,
+            settings,
+            headers=settings["HTTP_HEADER"],
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        content = response.content
+    except:
+        if warning:
+            show_message("Error connecting to server {} !".format(settings["URL"]))
+        return None, ""
+
+    fingerprint = hashlib.md5(content).hexdigest()
+    info = json.loads(content.decode())
+
+    return info, fingerprint
+
+
+def load_cached(settings):
+    path = get_catalog_path(settings)
+    if not os.path.isfile(path):
+        return None, ""
+
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except:
+        return None, ""
+
+    if not cache.get("url") == get_base_url(settings):
+        return None, ""
+
+    return cache.get("info"), cache.get("fingerprint", "")
+
+
+def save_cached(settings, info, fingerprint):
+    cache = {"url": get_base_url(settings), "fingerprint": fingerprint, "info": info}
+    save_json(get_catalog_path(settings), cache)
+
+
+def patch_cached(settings, class_type, value):
+    def patch():
+        info, fingerprint = load_cached(settings)
+        if not info:
+            return
+
+        info[class_type] = value
+        save_cached(settings, info, fingerprint)
+
+    thread = threading.Thread(target=patch)
+    thread.daemon = True
+    thread.start()
+
+
+def load(settings, use_cache=True, validate=False):
+    # the catalog is only downloaded if neither memory nor disk have it, with
+    # validate it is also checked against the server once per session, so node
+    # packs installed since the disk cache was written are seen
+    with catalog_lock:
+        if state["loaded"] and (state["validated"] or not validate):
+            return True
+
+        if use_cache and not validate and not state["loaded"]:
+            info, fingerprint = load_cached(settings)
+            if info:
+                set_info(info, fingerprint)
+                return True
+
+    # downloaded without the lock, readers keep the current catalog meanwhile
+    info, fingerprint = fetch_object_info(settings)
+
+    with catalog_lock:
+        if not info:
+            return state["loaded"]
+
+        if fingerprint == state["fingerprint"]:
+            state["validated"] = True
+            return True
+
+        set_info(info, fingerprint, validated=True)
+
+    save_cached(settings, info, fingerprint)
+    return True
@@ -0,0 +1,407 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import json
+import uuid
+import asyncio
+import threading
+from time import sleep, time
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import requests
+
+from . import metrics
+from .connection import GET, send_json, request, backoff, get_base_url
+from ..nuke_util.nuke_util import get_user_path
+from ..settings import HTTP_POOL_SIZE, HTTP_RETRIES, WS_RECONNECT_ATTEMPTS
+
+# One event loop per Nuke session. requests and websocket-client are blocking,
+# so the actual socket I/O runs on a pool bounded like the HTTP connection pool.
+loop = None
+loop_lock = threading.Lock()
+
+
+def get_loop():
+    global loop
+
+    with loop_lock:
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(HTTP_POOL_SIZE))
+
+            thread = threading.Thread(target=loop.run_forever)
+            thread.daemon = True
+            thread.start()
+
+    return loop
+
+
+def run_async(coro):
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro, timeout=None):
+    return run_async(coro).result(timeout)
+
+
+async def in_executor(func, *args, **kwargs):
+    return await get_loop().run_in_executor(None, partial(func, *args, **kwargs))
+
+
+async def in_thread(func, *args, **kwargs):
+    # for blocking steps that wait on transfers themselves, on the pool they
+    # would hold the threads their own transfers are queued for
+    future = Future()
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+
+    return await asyncio.wrap_future(future)
+
+
+async def create_event():
+    return asyncio.Event()
+
+
+def new_event():
+    # the event belongs to the client loop, set it from any thread with set_event
+    return run_sync(create_event())
+
+
+def set_event(event):
+    get_loop().call_soon_threadsafe(event.set)
+
+
+async def wait_event(event, timeout=None):
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+async def get(endpoint, settings, warning=True, timeout=30):
+    return await in_executor(GET, endpoint, settings, warning, timeout)
+
+
+async def post(endpoint, data, settings):
+    # returns the raw response, pass it to connection.read_post_response
+    # from the main thread to get the error message
+    return await in_executor(send_json, endpoint, data, settings)
+
+
+async def prompt(body, settings):
+    return await post("prompt", body, settings)
+
+
+async def queue(settings):
+    return await get("queue", settings, warning=False)
+
+
+async def history(prompt_id, settings):
+    return await get("history/{}".format(prompt_id), settings, warning=False)
+
+
+async def interrupt(prompt_id, settings, running=True):
+    endpoint = "interrupt" if running else "queue"
+    return await post(endpoint, {"delete": [prompt_id]}, settings)
+
+
+def view_sync(filename, subfolder, dst_path, settings, attempt=0):
+    # False only when the file does not exist, any other failure raises
+    endpoint = "api/view?filename={}&subfolder={}".format(filename, subfolder)
+    r = request("GET", endpoint, settings, headers=settings["HTTP_HEADER"], stream=True)
+
+    try:
+        if r.status_code == 404:
+            return False
+
+        r.raise_for_status()
+
+        with open(dst_path, "wb") as f:
+            for chunk in r.iter_content(8192):
+                f.write(chunk)
+
+        return True
+
+    except requests.RequestException:
+        # the transfer broke halfway, the whole file is requested again
+        if attempt >= HTTP_RETRIES or r.status_code >= 400:
+            raise
+
+        sleep(backoff(attempt))
+        return view_sync(filename, subfolder, dst_path, settings, attempt + 1)
+
+    finally:
+        r.close()
+
+
+async def view(filename, subfolder, dst_path, settings):
+    return await in_executor(view_sync, filename, subfolder, dst_path, settings)
+
+
+def upload_sync(image_path, subfolder, settings):
+    # read up front so a retried request sends the whole file again
+    with open(image_path, "rb") as f:
+        files = {"image": (os.path.basename(image_path), f.read())}
+
+    data = {"subfolder": subfolder, "overwrite": "true"}
+
+    resp = request(
+        "POST",
+        "upload/image",
+        settings,
+        headers=settings["HTTP_HEADER"],
+        files=files,
+        data=data,
+    )
+
+    return resp.status_code, resp.text
+
+
+async def upload(image_path, subfolder, settings):
+    return await in_executor(upload_sync, image_path, subfolder, settings)
+
+
+def get_ws_url(settings, client_id):
+    return "{}/ws?clientId={}".format(
+        get_base_url(settings).replace("http", "ws", 1), client_id
+    )
+
+
+# base_url -> {"client_id", "settings", "handlers": {prompt_id: (on_message, on_error)}}
+servers = {}
+servers_lock = threading.Lock()
+
+
+def get_server(settings):
+    base_url = get_base_url(settings)
+
+    with servers_lock:
+        server = servers.get(base_url)
+
+        if not server:
+            server = {
+                "client_id": "{}:{}".format(
+                    os.path.basename(get_user_path()), uuid.uuid4().hex[:12]
+                ),
+                "settings": dict(settings),
+                "handlers": {},
+                "thread": None,
+            }
+            servers[base_url] = server
+
+    return base_url, server
+
+
+def get_client_id(settings):
+    # every prompt sent to a server shares the session socket of that server
+    return get_server(settings)[1]["client_id"]
+
+
+def dispatch(server, message):
+    try:
+        message = json.loads(message)
+    except:
+        return
+
+    route(server, message)
+
+
+def route(server, message):
+    data = message.get("data") or {}
+    prompt_id = data.get("prompt_id")
+
+    with servers_lock:
+        handler = server["handlers"].get(prompt_id)
+
+    if handler:
+        get_loop().call_soon_threadsafe(handler[0], message)
+
+
+def fail_handlers(server, error):
+    with servers_lock:
+        handlers = list(server["handlers"].values())
+        server["handlers"].clear()
+
+    for _, on_error in handlers:
+        if on_error:
+            get_loop().call_soon_threadsafe(on_error, error)
+
+
+async def resync(server):
+    # prompts that finished while the socket was down never get their last message
+    with servers_lock:
+        prompt_ids = list(server["handlers"])
+
+    for prompt_id in prompt_ids:
+        data = await history(prompt_id, server["settings"])
+        if not data or not prompt_id in data:
+            continue
+
+        status = data[prompt_id].get("status") or {}
+
+        if status.get("status_str") == "error":
+            route(server, get_history_error(prompt_id, status))
+            continue
+
+        message = {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}}
+        route(server, message)
+
+
+def get_history_error(prompt_id, status):
+    # the execution_error message the socket would have sent, or an interruption
+    error = {
+        "prompt_id": prompt_id,
+        "node_id": "",
+        "node_type": "",
+        "exception_message": "Prompt failed while the connection was down",
+        "traceback": [],
+    }
+
+    for name, data in status.get("messages", []):
+        if name in ["execution_error", "execution_interrupted"]:
+            error.update({k: v for k, v in data.items() if v is not None})
+
+            if name == "execution_interrupted":
+                error["exception_message"] = "Prompt interrupted"
+
+    return {"type": "execution_error", "data": error}
+
+
+def read_server(server):
+    # imported here, only a submit that watches its prompt needs websocket-client
+    import websocket
+
+    settings = server["settings"]
+    headers = ["{}: {}".format(k, v) for k, v in settings["HTTP_HEADER"].items()]
+    url = get_ws_url(settings, server["client_id"])
+    failures = 0
+
+    server_url = get_base_url(settings)
+
+    def emit(method, status, start, response_bytes=0):
+        metrics.emit(
+            endpoint="ws",
+            server=server_url,
+            method=method,
+            status=status,
+            latency=time() - start,
+            request_bytes=0,
+            response_bytes=response_bytes,
+            retries=failures,
+        )
+
+    while True:
+        ws = websocket.WebSocket()
+        start = time()
+
+        try:
+            ws.connect(url, header=headers)
+        except Exception as e:
+            emit("CONNECT", None, start)
+            failures += 1
+
+            if failures >= WS_RECONNECT_ATTEMPTS:
+                fail_handlers(server, e)
+                failures = 0
+
+            with servers_lock:
+                if not server["handlers"]:
+                    server["thread"] = None
+                    return
+
+            sleep(min(2**failures, 10))
+            continue
+
+        emit("CONNECT", 101, start)
+
+        # also covers prompts that finished before the first connection
+        run_async(resync(server))
+        failures = 0
+
+        # the whole life of the socket is reported once it closes
+        start = time()
+        received = 0
+
+        while True:
+            try:
+                message = ws.recv()
+            except Exception:
+                break
+
+            if message:
+                received += len(message)
+                dispatch(server, message)
+
+        ws.close()
+        emit("RECV", 101, start, received)
+
+
+def watch(settings, prompt_id, on_message, on_error=None):
+    # routes the messages of prompt_id to on_message(message) and returns a
+    # function that stops watching, the server socket stays open
+    _, server = get_server(settings)
+
+    with servers_lock:
+        server["handlers"][prompt_id] = (on_message, on_error)
+
+        if not server["thread"]:
+            server["settings"] = dict(settings)
+            thread = threading.Thread(target=read_server, args=(server,))
+            thread.daemon = True
+            thread.start()
+            server["thread"] = thread
+
+    handler = (on_message, on_error)
+
+    def unwatch():
+        # by handler, the prompt may have been rekeyed since
+        with servers_lock:
+            for key, value in list(server["handlers"].items()):
+                if value is handler:
+                    del server["handlers"][key]
+
+    return unwatch
+
+
+def rekey(settings, prompt_id, new_prompt_id):
+    # older servers ignore the prompt_id sent with the prompt and make their own,
+    # whatever was sent under the new id before the rekey is caught up by resync
+    _, server = get_server(settings)
+
+    with servers_lock:
+        handler = server["handlers"].pop(prompt_id, None)
+        if not handler:
+            return
+
+        server["handlers"][new_prompt_id] = handler
+
+    run_async(resync(server))
+
+
+def transfer(coros):
+    # schedules every transfer at once and yields (index, result) as they finish,
+    # closing the generator early cancels whatever has not started yet
+    futures = {run_async(coro): i for i, coro in enumerate(coros)}
+
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        for future in futures:
+            future.cancel()
@@ -14,9 +14,12 @@ from ..nuke_util.nuke_util import get_connected_nodes
 if not getattr(nuke, "comfyui_running", False):
     nuke.comfyui_running = False
 
-image_inputs = ["image", "frames", "pixels", "images", "src_images"]
-mask_inputs = ["mask", "attn_mask", "mask_optional"]
-updated_inputs = False
+# Run node fullName -> fullName of its override settings node, "" if it has none
+override_nodes = {}
+override_callbacks = {"registered": False}
+# classes whose inputs decide which override node a Run finds, the callbacks
+# only run for them, not on every knob of the script
+OVERRIDE_PATH_CLASSES = ["Group", "Dot", "Switch"]
 
 
 def show_message(msg):
@@ -27,34 +30,22 @@ def show_message(msg):
 
 
 def update_images_and_mask_inputs(settings):
-    global image_inputs, mask_inputs, updated_inputs
+    # the catalog is shared with the menu, so it is only downloaded once per
+    # session, and not at all when the menu already checked it
+    from . import catalog
 
-    if updated_inputs:
-        return
-
-    updated_inputs = True
-
-    from .connection import GET
-
-    info = GET("object_info", settings)
-    if not info:
-        return
+    catalog.load(settings, validate=True)
 
-    for _, data in info.items():
-        input_data = data["input"]
-        required = input_data.get("required", {})
-        optional = input_data.get("optional", {})
 
-        for name, value in list(required.items()) + list(optional.items()):
-            class_type = value[0]
+def save_json(path, data):
+    # written aside and moved, so a crash never leaves half a file
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
 
-            if class_type in ["*", "IMAGE"]:
-                if not name in image_inputs:
-                    image_inputs.append(name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
 
-            if class_type in ["*", "MASK"]:
-                if not name in mask_inputs:
-                    mask_inputs.append(name)
+    os.replace(path + ".tmp", path)
 
 
 def get_date_code():
@@ -84,13 +75,7 @@ def get_settings(run_node=None):
         "BACKGROUND_SUBMIT": False,
     }
 
-    override_node = None
-    for n in get_connected_nodes(
-        run_node, ignore_disabled=True, continue_at_up_level=True
-    ):
-        if n.knob("override_settings"):
-            override_node = n
-            break
+    override_node = get_override_node(run_node)
 
     if override_node and override_node.knob("override_settings"):
 
@@ -119,10 +104,81 @@ def get_settings(run_node=None):
     return settings
 
 
+def find_override_node(run_node):
+    for n in get_connected_nodes(
+        run_node, ignore_disabled=True, continue_at_up_level=True
+    ):
+        if n.knob("override_settings"):
+            return n
+
+
+def get_override_node(run_node):
+    # only the graph walk is cached, the knobs of the override node are read
+    # on every call so their changes need no invalidation
+    if not run_node or not override_callbacks["registered"]:
+        return find_override_node(run_node)
+
+    key = run_node.fullName()
+
+    if key in override_nodes:
+        name = override_nodes[key]
+        # fullName is relative to root, toNode to the current group
+        override_node = nuke.toNode("root." + name) if name else None
+
+        if not name or override_node:
+            return override_node
+
+    override_node = find_override_node(run_node)
+    override_nodes[key] = override_node.fullName() if override_node else ""
+
+    return override_node
+
+
+def clear_override_nodes():
+    # also called wherever the plugin rewires nodes itself, setInput from
+    # Python does not reach the knobChanged callbacks
+    override_nodes.clear()
+
+
+def on_knob_changed():
+    # connections and disabled nodes change which override node a Run finds
+    if nuke.thisKnob().name() in ["inputChange", "disable"]:
+        override_nodes.clear()
+
+
+def on_create():
+    if nuke.thisNode().knob("override_settings"):
+        override_nodes.clear()
+
+
+def on_destroy():
+    # a node without dependents is not upstream of any Run
+    if nuke.thisNode().dependent():
+        override_nodes.clear()
+
+
+def register_callbacks():
+    if override_callbacks["registered"]:
+        return
+
+    for node_class in OVERRIDE_PATH_CLASSES:
+        nuke.addKnobChanged(on_knob_changed, nodeClass=node_class)
+        nuke.addOnDestroy(on_destroy, nodeClass=node_class)
+
+    # the override node is a Group
+    nuke.addOnCreate(on_create, nodeClass="Group")
+    nuke.addOnScriptLoad(clear_override_nodes)
+    nuke.addOnScriptClose(clear_override_nodes)
+
+    override_callbacks["registered"] = True
+
+
 def get_server_comfyui_dir(settings):
-    from .connection import GET
+    # the argv of a running server does not change, so the cached
+    # system_stats are used until a request to the server fails
+    from .server_status import get_system_stats
 
-    info = GET("system_stats", settings)
+    info = get_system_stats(settings, max_age=float("inf"), warning=True)
     if not info:
         return "."
 
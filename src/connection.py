@@ -5,30 +5,251 @@
 # -----------------------------------------------------------
 import sys
 import json
+import random
+import threading
 import traceback
+from time import time, sleep
 from collections import OrderedDict
 
-
-if sys.version_info.major == 2:
-    import urllib2 as urllib2  # type: ignore
-else:
-    import urllib.request as urllib2
+import requests
+from requests.adapters import HTTPAdapter
 
 import nuke  # type: ignore
+from . import metrics
 from .common import show_message
+from ..settings import (
+    HTTP_POOL_SIZE,
+    HTTP_RETRIES,
+    HTTP_RETRY_BACKOFF,
+    CIRCUIT_BREAKER_FAILURES,
+    CIRCUIT_BREAKER_RESET,
+)
+
+sessions = {}
+sessions_lock = threading.Lock()
+
+# base_url -> {"failures": consecutive failures, "opened": time the circuit opened,
+#              "probe": time the half open probe was sent, 0 if none}
+circuits = {}
+circuits_lock = threading.Lock()
+RETRY_STATUS = (502, 503, 504)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    pass
 
 
-def GET(endpoint, settings, warning=True, timeout=30):
+def get_base_url(settings):
     url = settings["URL"]
     if not "://" in url:
         url = "http://{}".format(url)
 
-    url = "{}/{}".format(url, endpoint)
-    request = urllib2.Request(url, headers=settings["HTTP_HEADER"])
+    return url.rstrip("/")
+
+
+def get_url(settings, endpoint):
+    return "{}/{}".format(get_base_url(settings), endpoint)
+
+
+def get_session(settings):
+    # one keep-alive pool per server, shared by every module
+    base_url = get_base_url(settings)
+
+    with sessions_lock:
+        session = sessions.get(base_url)
+
+        if not session:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, pool_block=True
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            sessions[base_url] = session
+
+    return session
+
+
+def close_sessions():
+    with sessions_lock:
+        for session in sessions.values():
+            session.close()
+
+        sessions.clear()
+
+
+def session_stats():
+    stats = {}
+
+    with sessions_lock:
+        items = list(sessions.items())
+
+    for base_url, session in items:
+        total_requests = 0
+        total_connections = 0
+
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if not pool:
+                    continue
+
+                total_requests += pool.num_requests
+                total_connections += pool.num_connections
+
+        stats[base_url] = {
+            "requests": total_requests,
+            "connections": total_connections,
+            "hits": max(total_requests - total_connections, 0),
+            "misses": total_connections,
+        }
+
+    return stats
+
+
+def print_session_stats():
+    for base_url, stats in sorted(session_stats().items()):
+        print(
+            "{}: {} requests, {} reused connections, {} new connections".format(
+                base_url, stats["requests"], stats["hits"], stats["misses"]
+            )
+        )
+
+
+def get_circuit_state(circuit, now):
+    if not circuit or circuit["failures"] < CIRCUIT_BREAKER_FAILURES:
+        return "closed"
+
+    if now - circuit["opened"] <= CIRCUIT_BREAKER_RESET:
+        return "open"
+
+    # a probe that never reported back does not keep the circuit shut
+    if now - circuit["probe"] <= CIRCUIT_BREAKER_RESET:
+        return "probing"
+
+    return "half_open"
+
+
+def is_available(settings):
+    # closed circuit, or open for long enough and no probe request in flight
+    with circuits_lock:
+        circuit = circuits.get(get_base_url(settings))
+        return get_circuit_state(circuit, time()) in ["closed", "half_open"]
+
+
+def acquire_circuit(settings):
+    # a half open circuit lets a single probe through, the other requests
+    # are refused until the probe records its result
+    with circuits_lock:
+        circuit = circuits.get(get_base_url(settings))
+        now = time()
+        state = get_circuit_state(circuit, now)
+
+        if state == "half_open":
+            circuit["probe"] = now
 
+        return state in ["closed", "half_open"]
+
+
+def record_result(settings, success):
+    base_url = get_base_url(settings)
+
+    with circuits_lock:
+        circuit = circuits.setdefault(
+            base_url, {"failures": 0, "opened": 0, "probe": 0}
+        )
+        circuit["probe"] = 0
+
+        if success:
+            circuit["failures"] = 0
+            return
+
+        circuit["failures"] += 1
+        if circuit["failures"] >= CIRCUIT_BREAKER_FAILURES:
+            circuit["opened"] = time()
+
+
+def backoff(attempt):
+    delay = HTTP_RETRY_BACKOFF * 2**attempt
+    return delay * random.uniform(0.5, 1.0)
+
+
+def get_request_bytes(response):
+    return int(response.request.headers.get("Content-Length") or 0)
+
+
+def get_response_bytes(response, stream=False):
+    if stream:
+        return int(response.headers.get("Content-Length") or 0)
+
+    return len(response.content)
+
+
+def request(method, endpoint, settings, idempotent=True, retries=None, **kwargs):
+    # only idempotent calls are retried, a prompt is never sent twice
+    if not acquire_circuit(settings):
+        raise CircuitOpenError("Server {} is not responding".format(settings["URL"]))
+
+    url = get_url(settings, endpoint)
+    retries = HTTP_RETRIES if retries is None else retries
+    attempts = retries + 1 if idempotent else 1
+    event = {
+        "endpoint": endpoint,
+        "server": get_base_url(settings),
+        "method": method,
+        "status": None,
+        "request_bytes": 0,
+        "response_bytes": 0,
+    }
+
+    start = time()
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+
+        try:
+            response = get_session(settings).request(method, url, **kwargs)
+        except requests.RequestException:
+            # the breaker counts calls, not attempts, a retried burst is one failure
+            if last_attempt:
+                record_result(settings, False)
+                metrics.emit(latency=time() - start, retries=attempt, **event)
+                raise
+
+            sleep(backoff(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUS:
+            if not last_attempt:
+                response.close()
+                sleep(backoff(attempt))
+                continue
+
+            record_result(settings, False)
+        else:
+            record_result(settings, True)
+
+        event["status"] = response.status_code
+        event["request_bytes"] = get_request_bytes(response)
+        event["response_bytes"] = get_response_bytes(response, kwargs.get("stream"))
+        metrics.emit(latency=time() - start, retries=attempt, **event)
+
+        return response
+
+
+def GET(endpoint, settings, warning=True, timeout=30, retries=None):
     try:
-        response = urllib2.urlopen(request, timeout=timeout)
-        data = response.read().decode()
+        response = request(
+            "GET",
+            endpoint,
+            settings,
+            retries=retries,
+            headers=settings["HTTP_HEADER"],
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        data = response.content.decode()
         return json.loads(data, object_pairs_hook=OrderedDict)
     except:
         if warning:
@@ -39,46 +260,55 @@ def GET(endpoint, settings, warning=True, timeout=30):
 
 
 def POST(endpoint, data, settings):
-    url = "{}/{}".format(settings["URL"], endpoint)
+    return read_post_response(send_json(endpoint, data, settings))
+
+
+def send_json(endpoint, data, settings):
+    # safe outside the main thread, read_post_response touches nuke
     headers = {"Content-Type": "application/json"}
     headers.update(settings["HTTP_HEADER"])
 
     bytes_data = json.dumps(data).encode("utf-8")
-    request = urllib2.Request(url, bytes_data, headers)
 
     try:
-        urllib2.urlopen(request)
-        return ""
+        return request(
+            "POST", endpoint, settings, idempotent=False, data=bytes_data, headers=headers
+        )
+    except Exception as e:
+        return "Error: {}".format(e)
 
-    except urllib2.HTTPError as e:
-        try:
-            error_bytes = e.read()
-            error_str = error_bytes.decode("utf-8", errors="ignore").strip()
 
-            try:
-                error = json.loads(error_str)
-            except json.JSONDecodeError:
-                show_message("Error parsing JSON from server")
-                return "ERROR: JSON parsing"
+def read_post_response(response):
+    if not hasattr(response, "status_code"):
+        return response
 
-            errors = "ERROR: {}\n\n".format(error["error"]["message"].upper())
-            node_errors = error["node_errors"] if error["node_errors"] else {}
+    if response.status_code < 400:
+        return ""
 
-            for name, value in node_errors.items():
-                nuke.toNode(name).setSelected(True)
-                errors += "{}:\n".format(name)
+    try:
+        error_str = response.content.decode("utf-8", errors="ignore").strip()
 
-                for err in value["errors"]:
-                    errors += " - {}: {}\n".format(err["details"], err["message"])
+        try:
+            error = json.loads(error_str)
+        except ValueError:
+            show_message("Error parsing JSON from server")
+            return "ERROR: JSON parsing"
 
-                errors += "\n"
+        errors = "ERROR: {}\n\n".format(error["error"]["message"].upper())
+        node_errors = error["node_errors"] if error["node_errors"] else {}
 
-            return errors
-        except:
-            show_message(traceback.format_exc())
+        for name, value in node_errors.items():
+            nuke.toNode(name).setSelected(True)
+            errors += "{}:\n".format(name)
 
-    except Exception as e:
-        return "Error: {}".format(e)
+            for err in value["errors"]:
+                errors += " - {}: {}\n".format(err["details"], err["message"])
+
+            errors += "\n"
+
+        return errors
+    except:
+        show_message(traceback.format_exc())
 
 
 def convert_to_utf8(data):
@@ -4,10 +4,12 @@
 # WEBSITE -------> https://vinavfx.com
 # -----------------------------------------------------------
 import nuke  # type: ignore
+from functools import partial
 from ..nuke_util.nuke_util import get_output_nodes
 from .run import submit
 from .queue_manager import resolve_submission_target
-from .common import get_settings
+from .common import get_settings, clear_override_nodes
+from .nodes import get_loader_models
 
 
 def multi_runs(runs, success_callback=None, force_queue=None):
@@ -25,6 +27,8 @@ def multi_runs(runs, success_callback=None, force_queue=None):
             for i, n in get_output_nodes(aux):
                 n.setInput(i, read)
 
+            clear_override_nodes()
+
         if not runs and success_callback:
             success_callback()
 
@@ -32,7 +36,8 @@ def multi_runs(runs, success_callback=None, force_queue=None):
 
     if not force_queue:
         settings = get_settings(run)
-        settings = resolve_submission_target(settings)
+        get_models = partial(get_loader_models, run)
+        settings = resolve_submission_target(settings, get_models=get_models)
         if not settings:
             return
 
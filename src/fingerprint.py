@@ -0,0 +1,356 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import hashlib
+import nuke  # type: ignore
+
+# classes whose output at a frame depends on other frames
+TIME_NODES = [
+    "TimeOffset",
+    "FrameHold",
+    "Retime",
+    "OFlow",
+    "OFlow2",
+    "Kronos",
+    "TimeBlur",
+    "FrameBlend",
+    "TimeEcho",
+    "TimeWarp",
+    "AppendClip",
+    "TimeClip",
+]
+ROTO_NODES = ["Roto", "RotoPaint"]
+
+# roto attributes that change the image, as named by nuke.rotopaint
+SHAPE_ATTRIBUTES = [
+    "opc",  # opacity
+    "bm",  # blend mode
+    "inv",  # invert
+    "ro",  # color
+    "go",
+    "bo",
+    "ao",
+    "ff",  # feather falloff
+    "vis",  # visible
+    "ltt",  # lifetime type
+    "ltn",  # lifetime start
+    "ltm",  # lifetime end
+    "mbo",  # motion blur
+    "mb",
+    "mbs",
+    "mbsot",
+]
+STROKE_ATTRIBUTES = [
+    "bs",  # brush size
+    "h",  # hardness
+    "bt",  # brush type
+    "src",  # clone source
+    "stx",
+    "sty",
+]
+
+# knobs that may vary without changing the image
+KNOBS_IGNORE = ["old_message", "old_expression_markers", "xpos", "ypos", "selected"]
+
+# node fullName -> knob hashes of the node, reused while its knobs are unchanged
+node_hashes = {}
+# (node fullName, roto part) already reported as unreadable
+roto_warnings = set()
+
+
+def md5(value):
+    return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+
+def get_signature(n):
+    # every knob of the node in a single call, any change invalidates the cache
+    flags = nuke.WRITE_NON_DEFAULT_ONLY | nuke.WRITE_USER_KNOB_DEFS | nuke.TO_SCRIPT
+    return md5(n.writeKnobs(flags))
+
+
+def get_roto_state(node, frames):
+    # shape geometry, shape attributes and the transforms of the shape and its
+    # layers at each frame, placed is False when part of it could not be read,
+    # None if the shapes can not be read at all
+    try:
+        import nuke.rotopaint as rp  # type: ignore
+
+        elements = []
+
+        def walk(layer, transforms):
+            for element in layer:
+                element_transforms = transforms + [element.getTransform()]
+
+                if isinstance(element, rp.Layer):
+                    walk(element, element_transforms)
+                    continue
+
+                if isinstance(element, rp.Shape):
+                    names = SHAPE_ATTRIBUTES
+                    points = []
+                    for cp in element:
+                        points += [
+                            cp.center,
+                            cp.leftTangent,
+                            cp.rightTangent,
+                            cp.featherCenter,
+                            cp.featherLeftTangent,
+                            cp.featherRightTangent,
+                        ]
+                elif isinstance(element, rp.Stroke):
+                    names = SHAPE_ATTRIBUTES + STROKE_ATTRIBUTES
+                    points = list(element)
+                else:
+                    continue
+
+                attributes = element.getAttributes()
+                elements.append(
+                    (element, points, attributes, names, element_transforms)
+                )
+
+        root = node.knob("curves").rootLayer
+        walk(root, [root.getTransform()])
+    except Exception as e:
+        warn_roto(node, "shapes", e)
+        return
+
+    roto_state = {}
+    placed = True
+
+    for frame in frames:
+        state = ""
+        for element, points, attributes, names, transforms in elements:
+            state += element.name
+            for point in points:
+                position = point.getPosition(frame)
+                state += " {} {}".format(position.x, position.y)
+
+            for name in names:
+                try:
+                    state += " {}".format(attributes.getValue(frame, name))
+                except Exception as e:
+                    warn_roto(node, "attribute " + name, e)
+                    placed = False
+
+            for transform in transforms:
+                try:
+                    matrix = transform.evaluate(frame).getMatrix()
+                    state += " {}".format([matrix[i] for i in range(16)])
+                except Exception as e:
+                    warn_roto(node, "transform", e)
+                    placed = False
+
+        roto_state[frame] = md5(state)
+
+    return roto_state, placed
+
+
+def warn_roto(node, what, error):
+    # once per node and part, the render falls back to the whole range
+    key = (node.fullName(), what)
+    if key in roto_warnings:
+        return
+
+    roto_warnings.add(key)
+    print(
+        "ComfyUI: can not read the roto {} of {}, its changes re-render every "
+        "frame: {}".format(what, node.fullName(), error)
+    )
+
+
+def hash_knobs(n, frames):
+    # static knobs are hashed once, keyframed knobs and roto shapes get one hash
+    # per frame, expressions are kept by name since they can read anything
+    static = ""
+    curves = ""
+    keyframed = {frame: "" for frame in frames}
+    expressions = []
+
+    roto, placed = None, True
+    if n.Class() in ROTO_NODES:
+        roto, placed = get_roto_state(n, frames) or (None, True)
+
+    for k in n.knobs().values():
+        if not k.visible() or not k.enabled():
+            continue
+
+        if k.name() in KNOBS_IGNORE:
+            continue
+
+        if roto and k.name() == "curves":
+            curves = md5(k.toScript())
+            continue
+
+        if hasattr(k, "valueAt") and k.hasExpression():
+            expressions.append(k.name())
+            continue
+
+        if hasattr(k, "valueAt") and k.isAnimated():
+            for frame in frames:
+                try:
+                    keyframed[frame] += "{} ".format(k.valueAt(frame))
+                except:
+                    keyframed[frame] += k.toScript()
+            continue
+
+        static += "{} {} ".format(k.name(), k.toScript())
+
+    per_frame = None
+    if roto or any(keyframed.values()):
+        per_frame = {
+            frame: md5((roto[frame] if roto else "") + keyframed[frame])
+            for frame in frames
+        }
+
+    return {
+        "static": md5(n.Class() + static),
+        "curves": curves,
+        "placed": placed,
+        "per_frame": per_frame,
+        "expressions": expressions,
+    }
+
+
+def get_node_hashes(n, frames):
+    key = n.fullName()
+    signature = get_signature(n)
+    frame_range = (frames[0], frames[-1]) if frames else ()
+
+    cached = node_hashes.get(key)
+    if cached and cached["signature"] == signature:
+        if cached["frame_range"] == frame_range:
+            return cached
+
+    hashes = hash_knobs(n, frames)
+    hashes["signature"] = signature
+    hashes["frame_range"] = frame_range
+    node_hashes[key] = hashes
+
+    return hashes
+
+
+def get_upstream_nodes(n):
+    # inputs, the output of a group's internals, and for a group's Input node
+    # the matching input of the group itself
+    upstream = [n.input(i) for i in range(n.inputs())]
+
+    if n.Class() == "Input":
+        parent = n.parent()
+        if isinstance(parent, nuke.Group) and not isinstance(parent, nuke.Root):
+            upstream.append(parent.input(int(n.knob("number").value())))
+
+    elif isinstance(n, nuke.Group) and not isinstance(n, nuke.Root):
+        upstream += [c for c in n.nodes() if c.Class() == "Output"]
+
+    return [u for u in upstream if u]
+
+
+def get_upstream_state(node, frames):
+    # Merkle digest of the upstream graph, every node combines the hashes of its
+    # own knobs with the digests of its inputs, per frame digests are only
+    # computed down the branches that actually vary in time
+    digests = {}
+    upstream = {}
+    state = {"curves": "", "placed": True, "time_dependent": False}
+
+    def digest(n):
+        hashes = get_node_hashes(n, frames)
+
+        # an input still being visited closes a cycle through groups
+        inputs = [
+            digests.get(u.fullName(), ("", None)) for u in upstream[n.fullName()]
+        ]
+
+        static = md5(hashes["static"] + "".join(d[0] for d in inputs))
+
+        if n.Class() in TIME_NODES:
+            state["time_dependent"] = True
+
+        state["curves"] += hashes["curves"]
+        state["placed"] = state["placed"] and hashes["placed"]
+
+        per_frame = None
+        varying = [d[1] for d in inputs if d[1]]
+
+        if hashes["per_frame"] or hashes["expressions"] or varying:
+            per_frame = {}
+
+            for frame in frames:
+                value = hashes["per_frame"][frame] if hashes["per_frame"] else ""
+
+                for name in hashes["expressions"]:
+                    try:
+                        value += "{} ".format(n.knob(name).valueAt(frame))
+                    except:
+                        value += n.knob(name).toScript()
+
+                value += "".join(v[frame] for v in varying)
+                per_frame[frame] = md5(value)
+
+        return static, per_frame
+
+    # iterative post-order, deep comps go past the recursion limit
+    stack = [(node, False)]
+    while stack:
+        n, visited = stack.pop()
+        key = n.fullName()
+
+        if visited:
+            digests[key] = digest(n)
+            continue
+
+        if key in upstream:
+            continue
+
+        upstream[key] = get_upstream_nodes(n)
+        stack.append((n, True))
+
+        for u in upstream[key]:
+            if not u.fullName() in upstream:
+                stack.append((u, False))
+
+    static, per_frame = digests[node.fullName()]
+
+    return {
+        "static": static,
+        "curves": md5(state["curves"]),
+        "curves_placed": state["placed"],
+        "frames": {
+            str(frame): per_frame[frame] if per_frame else "" for frame in frames
+        },
+        "time_dependent": state["time_dependent"],
+    }
+
+
+def get_dirty_frames(current_state, prev_state, frame_file):
+    frames = [int(frame) for frame in current_state["frames"]]
+    prev_frames = prev_state.get("frames", {})
+
+    if not prev_state or not current_state["static"] == prev_state.get("static"):
+        return frames
+
+    changed = [
+        frame
+        for frame in frames
+        if not current_state["frames"][str(frame)] == prev_frames.get(str(frame))
+    ]
+
+    # a frame of a time node depends on other frames, and a roto change is
+    # only limited to the changed frames when every part of the shapes was read
+    if changed and current_state["time_dependent"]:
+        return frames
+
+    if not current_state["curves"] == prev_state.get("curves"):
+        if not changed or not current_state.get("curves_placed"):
+            return frames
+
+    missing = [frame for frame in frames if not os.path.isfile(frame_file(frame))]
+
+    return sorted(set(changed) | set(missing))
+
+
+def clear():
+    node_hashes.clear()
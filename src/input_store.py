@@ -0,0 +1,275 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import json
+import shutil
+from time import time, sleep
+from contextlib import contextmanager
+
+from ..nuke_util.nuke_util import get_project_name
+from ..settings import INPUT_STORE_MAX_SIZE
+from .common import (
+    get_name_code,
+    get_comfyui_dir,
+    get_server_comfyui_dir,
+    save_json,
+)
+from .connection import get_base_url
+
+# a lock older than this was left by a session that crashed holding it
+LOCK_STALE = 60
+# a lease never released, like the one of a background submit, expires after this
+LEASE_MAX = 24 * 3600
+
+# Rendered input sequences are addressed by their content, the key is the upstream
+# fingerprint plus everything that changes the files, so identical inputs are
+# shared by every Run, gizmo and project that feeds them to the same ComfyUI.
+#
+# index: key -> {"dirname", "sequence_dir", "filepath", "frame_range", "ext",
+#                "location", "owners", "size", "accessed", "state_id"}
+# leases: prompt id -> {"keys", "time"} of the prompts queued or running
+
+
+def get_index_path(settings, name="input_store"):
+    return os.path.join(settings["TEMPORAL_DIR"], name + ".json")
+
+
+def load_index(settings, name="input_store"):
+    try:
+        with open(get_index_path(settings, name)) as f:
+            index = json.load(f)
+    except:
+        index = {}
+
+    index.setdefault("entries", {})
+    return index
+
+
+def save_index(settings, index, name="input_store"):
+    save_json(get_index_path(settings, name), index)
+
+
+def acquire_lock(path):
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return
+        except OSError:
+            pass
+
+        try:
+            if time() - os.path.getmtime(path) > LOCK_STALE:
+                os.remove(path)
+                continue
+        except OSError:
+            continue
+
+        sleep(0.05)
+
+
+@contextmanager
+def locked_index(settings, name="input_store"):
+    # Nuke sessions and farm nodes share the index, it is read, changed and
+    # written back under a lock file so none of them drops the entries of another
+    path = get_index_path(settings, name)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    acquire_lock(path + ".lock")
+
+    try:
+        index = load_index(settings, name)
+        yield index
+        save_index(settings, index, name)
+    finally:
+        os.remove(path + ".lock")
+
+
+def get_location(settings):
+    # a sequence can only be shared where the same ComfyUI reads it
+    if settings["COMFYUI_LOCAL"]:
+        return os.path.abspath(get_comfyui_dir(settings))
+
+    return get_base_url(settings)
+
+
+def get_key(state, frame_range, ext, settings):
+    content = json.dumps(
+        [
+            state["static"],
+            state["curves"],
+            state["time_dependent"],
+            sorted(state["frames"].items()),
+            frame_range,
+            ext,
+            get_location(settings),
+        ]
+    )
+    return get_name_code(content)
+
+
+def get_owner(node):
+    return "{}:{}".format(get_project_name(), node.fullName())
+
+
+def get_sequence_paths(dirname, settings):
+    # (local directory of the frames, directory as ComfyUI sees it)
+    relative_input = os.path.join("input", dirname)
+
+    if settings["COMFYUI_LOCAL"]:
+        sequence_dir = os.path.join(get_comfyui_dir(settings), relative_input)
+        sequence_dir = sequence_dir.replace("\\", "/")
+    else:
+        sequence_dir = os.path.join(settings["TEMPORAL_DIR"], relative_input)
+
+    filepath = os.path.join(get_server_comfyui_dir(settings), relative_input)
+
+    return sequence_dir, filepath
+
+
+def frame_file(sequence_dir, frame, ext):
+    dirname = os.path.basename(sequence_dir.rstrip("/\\"))
+    return "{}/{}_{}.{}".format(sequence_dir, dirname, str(frame).zfill(5), ext)
+
+
+def get_fingerprints_path(sequence_dir):
+    # next to the sequence, the loaders only see the images in it
+    return sequence_dir.rstrip("/\\") + ".json"
+
+
+def load_fingerprints(sequence_dir):
+    path = get_fingerprints_path(sequence_dir)
+    if not os.path.isfile(path):
+        return {}
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except:
+        return {}
+
+
+def save_fingerprints(sequence_dir, state):
+    save_json(get_fingerprints_path(sequence_dir), state)
+
+
+def find(index, key, frames):
+    # only a sequence with every frame still on disk can be reused
+    entry = index["entries"].get(key)
+    if not entry:
+        return
+
+    for frame in frames:
+        if not os.path.isfile(frame_file(entry["sequence_dir"], frame, entry["ext"])):
+            del index["entries"][key]
+            return
+
+    return entry
+
+
+def find_owned(index, owner):
+    for key, entry in index["entries"].items():
+        if owner in entry["owners"]:
+            return key, entry
+
+    return None, None
+
+
+def claim(index, key, owner):
+    # an owner points to a single sequence, the ones it leaves stay cached
+    for other_key, entry in index["entries"].items():
+        if not other_key == key and owner in entry["owners"]:
+            entry["owners"].remove(owner)
+
+    entry = index["entries"][key]
+    if not owner in entry["owners"]:
+        entry["owners"].append(owner)
+
+    entry["accessed"] = time()
+    return entry
+
+
+def seed(src_dir, dst_dir, frames, ext):
+    # unchanged frames of the previous sequence, hard links where possible
+    for frame in frames:
+        src = frame_file(src_dir, frame, ext)
+        dst = frame_file(dst_dir, frame, ext)
+
+        if not os.path.isfile(src) or os.path.isfile(dst):
+            continue
+
+        try:
+            os.link(src, dst)
+        except:
+            shutil.copy2(src, dst)
+
+
+def get_size(sequence_dir):
+    size = 0
+    for filename in os.listdir(sequence_dir):
+        size += os.path.getsize(os.path.join(sequence_dir, filename))
+
+    return size
+
+
+def remove_sequence(sequence_dir):
+    shutil.rmtree(sequence_dir, ignore_errors=True)
+
+    path = get_fingerprints_path(sequence_dir)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def lease(settings, lease_id, prompt):
+    # the sequences a submitted prompt loads are kept until it finishes
+    paths = set()
+    for node in prompt.values():
+        for value in node.get("inputs", {}).values():
+            if isinstance(value, str):
+                paths.add(value)
+
+    with locked_index(settings) as index:
+        keys = [k for k, e in index["entries"].items() if e["filepath"] in paths]
+        if keys:
+            index.setdefault("leases", {})[lease_id] = {"keys": keys, "time": time()}
+
+    return bool(keys)
+
+
+def release(settings, lease_id):
+    with locked_index(settings) as index:
+        index.setdefault("leases", {}).pop(lease_id, None)
+
+
+def get_leased(index):
+    leases = index.setdefault("leases", {})
+    now = time()
+
+    for lease_id, item in list(leases.items()):
+        if now - item["time"] > LEASE_MAX:
+            del leases[lease_id]
+
+    return set(key for item in leases.values() for key in item["keys"])
+
+
+def evict(index, keep):
+    # least recently used first, a remote ComfyUI keeps its uploaded copy
+    # since the server has no endpoint to delete inputs, and a sequence that
+    # a queued or running prompt still loads is not touched
+    entries = index["entries"]
+    total = sum(entry["size"] for entry in entries.values())
+    leased = get_leased(index)
+
+    for key, entry in sorted(entries.items(), key=lambda item: item[1]["accessed"]):
+        if total <= INPUT_STORE_MAX_SIZE:
+            break
+
+        if key == keep or key in leased:
+            continue
+
+        remove_sequence(entry["sequence_dir"])
+        total -= entry["size"]
+        del entries[key]
@@ -0,0 +1,137 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import json
+import threading
+from collections import deque
+
+# every request emits one event to each hook:
+# {"endpoint", "server", "method", "status", "latency", "request_bytes",
+#  "response_bytes", "retries"}
+hooks = []
+
+MAX_SAMPLES = 2048
+endpoints = {}
+endpoints_lock = threading.Lock()
+
+
+def add_hook(func):
+    if not func in hooks:
+        hooks.append(func)
+
+
+def remove_hook(func):
+    if func in hooks:
+        hooks.remove(func)
+
+
+def emit(**event):
+    for hook in list(hooks):
+        try:
+            hook(event)
+        except:
+            pass
+
+
+def endpoint_name(endpoint):
+    # "api/view?filename=..." -> "api/view", "history/<prompt_id>" -> "history"
+    parts = endpoint.split("?")[0].strip("/").split("/")
+    return "/".join(parts[:2]) if parts[0] == "api" else parts[0]
+
+
+def collect(event):
+    key = "{} {}".format(event["method"], endpoint_name(event["endpoint"]))
+
+    with endpoints_lock:
+        stats = endpoints.setdefault(
+            key,
+            {
+                "count": 0,
+                "errors": 0,
+                "retries": 0,
+                "request_bytes": 0,
+                "response_bytes": 0,
+                "latencies": deque(maxlen=MAX_SAMPLES),
+                "servers": set(),
+            },
+        )
+
+        stats["count"] += 1
+        stats["retries"] += event["retries"]
+        stats["request_bytes"] += event["request_bytes"]
+        stats["response_bytes"] += event["response_bytes"]
+        stats["latencies"].append(event["latency"])
+        stats["servers"].add(event["server"])
+
+        if not event["status"] or event["status"] >= 400:
+            stats["errors"] += 1
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+
+    index = min(int(round(p / 100.0 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def summary():
+    result = {}
+
+    with endpoints_lock:
+        items = [
+            (key, dict(stats, latencies=sorted(stats["latencies"])))
+            for key, stats in endpoints.items()
+        ]
+
+    for key, stats in sorted(items):
+        latencies = stats["latencies"]
+        result[key] = {
+            "count": stats["count"],
+            "errors": stats["errors"],
+            "retries": stats["retries"],
+            "request_bytes": stats["request_bytes"],
+            "response_bytes": stats["response_bytes"],
+            "servers": sorted(stats["servers"]),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0,
+        }
+
+    return result
+
+
+def print_summary():
+    for key, stats in summary().items():
+        print(
+            "{}: {} calls, {} errors, {} retries, p50 {} ms, p90 {} ms, p99 {} ms, "
+            "sent {} B, received {} B".format(
+                key,
+                stats["count"],
+                stats["errors"],
+                stats["retries"],
+                stats["p50_ms"],
+                stats["p90_ms"],
+                stats["p99_ms"],
+                stats["request_bytes"],
+                stats["response_bytes"],
+            )
+        )
+
+
+def dump_json(filepath):
+    with open(filepath, "w") as f:
+        json.dump(summary(), f, indent=4)
+
+    return filepath
+
+
+def reset():
+    with endpoints_lock:
+        endpoints.clear()
+
+
+add_hook(collect)
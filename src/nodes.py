@@ -8,22 +8,19 @@ import os
 import shutil
 import random
 import traceback
+from time import time
 from collections import Counter
 import nuke  # type: ignore
-from ..testing.testing import status_diff
 from .upload_and_download import upload_images
 
-from ..nuke_util.nuke_util import get_connected_nodes, get_project_name
-from .common import (
-    image_inputs,
-    mask_inputs,
-    get_server_comfyui_dir,
-    get_comfyui_dir,
-    get_name_code,
-    show_message,
-)
+from . import catalog
+from .fingerprint import get_upstream_state, get_dirty_frames
+from . import render, input_store
+from .input_store import load_fingerprints, save_fingerprints
+from .common import show_message
 
-states = {}
+# node fullName -> (raw data knob value, normalized json)
+node_data_cache = {}
 
 
 def extract_data(run_node, settings):
@@ -70,8 +67,10 @@ def extract_data(run_node, settings):
                     seed_knob.setValue(random_value)
                     node_data["inputs"][seed_knob.name()[:-1]] = random_value
 
-        for key in image_inputs + mask_inputs:
-            input_key = node_data["inputs"].get(key)
+        for key, input_key in list(node_data["inputs"].items()):
+            if not catalog.is_image_or_mask_input(key):
+                continue
+
             if not input_key or not type(input_key) == list:
                 continue
 
@@ -107,43 +106,10 @@ def extract_data(run_node, settings):
 
 
 def create_load_images_and_save(node, tonemap, settings):
-    global states
-    connected_nodes = get_connected_nodes(node, continue_at_up_level=True)
-    connected_nodes.append(node)
-    state = ""
-
-    for n in connected_nodes:
-        n.setSelected(False)
-        node_state = ""
-
-        # knobs that may vary
-        knobs_ignore = ["old_message", "old_expression_markers"]
-
-        for k in n.knobs().values():
-            if not k.visible() or not k.enabled():
-                continue
-
-            if k.name() in knobs_ignore:
-                continue
-
-            if k.hasExpression() or k.isAnimated():
-                try:
-                    value = k.valueAt(0)
-                except:
-                    value = k.toScript()
-            else:
-                value = k.toScript()
-
-            node_state += "{} ".format(value)
-
-        node_state = node_state.replace(str(n.xpos()), "").replace(str(n.ypos()), "")
-
-        state += node_state
-
-    current_state = {"connected_nodes": state.strip(), "state_id": 0}
-    prev_state = states.get(node.fullName(), {})
-
     frame_range = [node.firstFrame(), node.lastFrame()]
+    frames = list(range(frame_range[0], frame_range[1] + 1))
+
+    current_state = get_upstream_state(node, frames)
     USE_EXR_TO_LOAD_IMAGES = settings["USE_EXR_TO_LOAD_IMAGES"]
 
     if USE_EXR_TO_LOAD_IMAGES:
@@ -172,92 +138,136 @@ def create_load_images_and_save(node, tonemap, settings):
             "class_type": "VHS_LoadImagesPath",
         }
 
-    if current_state.get("connected_nodes") == prev_state.get("connected_nodes"):
-        sequence_dir = prev_state.get("sequence_dir", "none")
-        filepath = prev_state.get("filepath", "none")
-        same_exr_setting = (
-            prev_state.get("USE_EXR_TO_LOAD_IMAGES") == USE_EXR_TO_LOAD_IMAGES
-        )
-
-        if (
-            os.path.isdir(sequence_dir)
-            and os.listdir(sequence_dir)
-            and same_exr_setting
-        ):
-            load_image_data["inputs"][filepath_key] = filepath
-            load_image_data["inputs"]["id"] = prev_state.get("state_id", 0)
-            return load_image_data, False, False
-
-    # For debugging
-    #  status_diff(prev_state.get('connected_nodes'),
-    #  current_state.get('connected_nodes'))
-
-    dirname = get_name_code(
-        "{}{}{}{}".format(
-            get_project_name(), node.fullName(), frame_range[0], frame_range[1]
-        )
+    ext = "exr" if USE_EXR_TO_LOAD_IMAGES else "png"
+    owner = input_store.get_owner(node)
+    key = input_store.get_key(current_state, frame_range, ext, settings)
+
+    # the index is only locked while it is read and written, not while rendering
+    with input_store.locked_index(settings) as index:
+        prev_key, prev_entry = input_store.find_owned(index, owner)
+        entry = input_store.find(index, key, frames)
+
+        if entry:
+            # the same input was already rendered, by this node or any other
+            input_store.claim(index, key, owner)
+
+    if entry:
+        load_image_data["inputs"][filepath_key] = entry["filepath"]
+        load_image_data["inputs"]["id"] = entry["state_id"]
+        return load_image_data, not prev_key == key, False
+
+    prev_state = {}
+    if prev_entry and prev_entry["frame_range"] == frame_range:
+        if prev_entry["ext"] == ext:
+            prev_state = load_fingerprints(prev_entry["sequence_dir"])
+
+    # a sequence only this node uses is updated in place, a shared one is
+    # copied first so the other owners keep their frames, and one that lives
+    # on another ComfyUI is copied and uploaded in full
+    location = input_store.get_location(settings)
+    exclusive = (
+        bool(prev_state)
+        and prev_entry["owners"] == [owner]
+        and prev_entry.get("location") == location
     )
 
-    relative_input = os.path.join("input", dirname)
-    filepath = os.path.join(get_server_comfyui_dir(settings), relative_input)
+    if exclusive:
+        dirname = prev_entry["dirname"]
+        sequence_dir = prev_entry["sequence_dir"]
+        filepath = prev_entry["filepath"]
 
-    comfyui_input_dir = os.path.join(get_comfyui_dir(settings), relative_input).replace(
-        "\\", "/"
-    )
+        if not os.path.isdir(sequence_dir):
+            os.makedirs(sequence_dir)
+    else:
+        dirname = key
+        sequence_dir, filepath = input_store.get_sequence_paths(dirname, settings)
 
-    tmp_input_dir = os.path.join(settings["TEMPORAL_DIR"], relative_input)
-    sequence_dir = comfyui_input_dir if settings["COMFYUI_LOCAL"] else tmp_input_dir
+        if os.path.isdir(sequence_dir):
+            shutil.rmtree(sequence_dir)
 
-    if os.path.isdir(sequence_dir):
-        shutil.rmtree(sequence_dir)
+        os.makedirs(sequence_dir)
+
+        if prev_state:
+            input_store.seed(prev_entry["sequence_dir"], sequence_dir, frames, ext)
 
-    os.makedirs(sequence_dir)
-    ext = "exr" if USE_EXR_TO_LOAD_IMAGES else "png"
     filename = "{}/{}_#####.{}".format(sequence_dir, dirname, ext)
 
-    [n.setSelected(False) for n in nuke.selectedNodes()]
-
-    onode = node
-    invert = None
-    if not USE_EXR_TO_LOAD_IMAGES:
-        # VHS_LoadImages inverts the alpha
-        invert = nuke.createNode("Invert", inpanel=False)
-        invert.knob("channels").setValue("alpha")
-        invert.setInput(0, node)
-        invert.setXYpos(node.xpos(), node.ypos())
-        onode = invert
-
-    write = nuke.createNode("Write", inpanel=False)
-    write.knob("hide_input").setValue(True)
-    write.setName(node.name() + "_write")
-    write.setXYpos(node.xpos(), node.ypos())
-    write.setSelected(False)
-    write.setInput(0, onode)
-    write.knob("file").setValue(filename)
-    write.knob("raw").setValue(USE_EXR_TO_LOAD_IMAGES)
-    write.knob("file_type").setValue(ext)
-    write.knob("channels").setValue("rgba")
-
-    try:
-        nuke.execute(write, node.firstFrame(), node.lastFrame())
-        if not settings["COMFYUI_LOCAL"]:
-            upload_images(sequence_dir, settings)
-    except:
+    def frame_file(frame):
+        return input_store.frame_file(sequence_dir, frame, ext)
+
+    dirty_frames = get_dirty_frames(current_state, prev_state, frame_file)
+    upload_frames = dirty_frames if exclusive else frames
+    state_id = prev_state.get("state_id", 0)
+
+    if dirty_frames:
+        [n.setSelected(False) for n in nuke.selectedNodes()]
+
+        onode = node
+        invert = None
+        if not USE_EXR_TO_LOAD_IMAGES:
+            # VHS_LoadImages inverts the alpha
+            invert = nuke.createNode("Invert", inpanel=False)
+            invert.knob("channels").setValue("alpha")
+            invert.setInput(0, node)
+            invert.setXYpos(node.xpos(), node.ypos())
+            onode = invert
+
+        write = nuke.createNode("Write", inpanel=False)
+        write.knob("hide_input").setValue(True)
+        write.setName(node.name() + "_write")
+        write.setXYpos(node.xpos(), node.ypos())
+        write.setSelected(False)
+        write.setInput(0, onode)
+        write.knob("file").setValue(filename)
+        write.knob("raw").setValue(USE_EXR_TO_LOAD_IMAGES)
+        write.knob("file_type").setValue(ext)
+        write.knob("channels").setValue("rgba")
+
+        try:
+            render.execute(write, dirty_frames, settings)
+        except:
+            nuke.delete(write)
+            nuke.delete(invert)
+            show_message(traceback.format_exc())
+            return {}, False, True
+
         nuke.delete(write)
         nuke.delete(invert)
-        show_message(traceback.format_exc())
-        return {}, False, True
 
-    nuke.delete(write)
-    nuke.delete(invert)
+        # a new id makes ComfyUI load the sequence again
+        state_id = random.randrange(1, 9999)
+
+    if not settings["COMFYUI_LOCAL"] and upload_frames:
+        try:
+            files = [os.path.basename(frame_file(frame)) for frame in upload_frames]
+            upload_images(sequence_dir, settings, files)
+        except:
+            show_message(traceback.format_exc())
+            return {}, False, True
 
-    state_id = random.randrange(1, 9999)
-    current_state["sequence_dir"] = sequence_dir
-    current_state["filepath"] = filepath
-    current_state["USE_EXR_TO_LOAD_IMAGES"] = USE_EXR_TO_LOAD_IMAGES
+    current_state["ext"] = ext
     current_state["state_id"] = state_id
 
-    states[node.fullName()] = current_state
+    with input_store.locked_index(settings) as index:
+        if exclusive:
+            index["entries"].pop(prev_key, None)
+
+        index["entries"][key] = {
+            "dirname": dirname,
+            "sequence_dir": sequence_dir,
+            "filepath": filepath,
+            "frame_range": frame_range,
+            "ext": ext,
+            "location": location,
+            "owners": [],
+            "size": input_store.get_size(sequence_dir),
+            "accessed": time(),
+            "state_id": state_id,
+        }
+        input_store.claim(index, key, owner)
+        input_store.evict(index, keep=key)
+
+    save_fingerprints(sequence_dir, current_state)
 
     load_image_data["inputs"][filepath_key] = filepath
     load_image_data["inputs"]["id"] = state_id
@@ -310,7 +320,29 @@ def get_connected_comfyui_nodes(root_node, visited=None, ignore_nodes=[]):
     return sd_nodes
 
 
+def get_loader_models(run_node):
+    from .scheduler import prompt_models
+
+    nodes = get_connected_comfyui_nodes(run_node)
+    return prompt_models({n.name(): node_data for n, node_data in nodes})
+
+
+def normalize_node_data(value):
+    return (
+        value.split("#")[0]
+        .replace("'", '"')
+        .replace("True", "true")
+        .replace("False", "false")
+    )
+
+
+def parse_node_data(value):
+    return json.loads(normalize_node_data(value))
+
+
 def get_node_data(node):
+    # only the normalized text is cached, every caller gets its own dict so
+    # changing it without save_node_data can not leak into later calls
     data_knob = node.knob("data")
 
     if not data_knob:
@@ -320,16 +352,20 @@ def get_node_data(node):
     if not "class_type" in value:
         return {}
 
-    data = (
-        value.split("#")[0]
-        .replace("'", '"')
-        .replace("True", "true")
-        .replace("False", "false")
-    )
-    return json.loads(data)
+    key = node.fullName()
+    cached = node_data_cache.get(key)
+
+    if cached and cached[0] == value:
+        return json.loads(cached[1])
+
+    text = normalize_node_data(value)
+    node_data_cache[key] = (value, text)
+
+    return json.loads(text)
 
 
 def save_node_data(node, data):
+    node_data_cache.pop(node.fullName(), None)
     node.knob("data").setValue(json.dumps(data, indent=4))
 
 
@@ -379,9 +415,9 @@ def extract_node_data(node):
         output_index = 0
 
         if not get_node_data(inode):
-            if input_name in image_inputs:
+            if catalog.is_image_input(input_name):
                 output_index = 0
-            elif input_name in mask_inputs:
+            elif catalog.is_mask_input(input_name):
                 output_index = 1
         else:
             output_index = get_output_index(node, data, i)
@@ -438,7 +474,7 @@ def check_node(node):
         inode_data = get_node_data(inode)
 
         if not inode_data:
-            if input_name in image_inputs + mask_inputs:
+            if catalog.is_image_or_mask_input(input_name):
                 if inode.bbox().w() < 10 or inode.bbox().h() < 10:
                     show_message(
                         '{}: input "{}" not connected or bbox without information in some frame !'.format(
@@ -7,11 +7,19 @@ import json
 import re
 import nuke  # type: ignore
 
-from .connection import GET, POST
+from . import client
+from .connection import read_post_response
 from .common import show_message
+from .server_status import get_snapshots, get_snapshot
+from .scheduler import choose_server
 
 
-def resolve_submission_target(settings, force_queue=None):
+def get_client_label(queue_item):
+    extra_data = queue_item[3]
+    return extra_data.get("client_label", extra_data.get("client_id", ""))
+
+
+def resolve_submission_target(settings, force_queue=None, get_models=None):
     url = settings["URL"]
     urls = []
 
@@ -31,33 +39,25 @@ def resolve_submission_target(settings, force_queue=None):
 
     urls = [url if "://" in url else "http://{}".format(url) for url in urls]
 
-    available_url = ""
-    lowest_load_url = None
-    lowest_pending = 99999
     localhost_submit = False
 
     running_client = []
     pending_client = []
 
-    for url in urls:
-        settings["URL"] = url
-        queue = GET("queue", settings, warning=False, timeout=3)
+    # the models walk the whole graph, they only matter with servers to choose from
+    models = get_models() if get_models and len(urls) > 1 else None
 
-        if not queue:
-            continue
+    snapshots = get_snapshots(urls, settings)
+    available_url, lowest_load_url = choose_server(snapshots, models)
 
-        running = queue["queue_running"]
-        pending = queue["queue_pending"]
+    for _, snapshot in snapshots:
+        queue = snapshot["queue"]
 
-        if len(pending) < lowest_pending:
-            lowest_pending = len(pending)
-            lowest_load_url = url
-
-        if not available_url and not running:
-            available_url = url
+        if not queue:
+            continue
 
-        running_client += [r[3]["client_id"] for r in running]
-        pending_client += [p[3]["client_id"] for p in pending]
+        running_client += [get_client_label(r) for r in queue["queue_running"]]
+        pending_client += [get_client_label(p) for p in queue["queue_pending"]]
 
     if not available_url and not lowest_load_url:
         show_message("{}\nNo ComfyUI servers found running !".format(", ".join(urls)))
@@ -137,29 +137,31 @@ def resolve_submission_target(settings, force_queue=None):
             )
             return
 
-    if not GET("system_stats", settings):
+    if not get_snapshot(settings)["reachable"]:
+        show_message("Error connecting to server {} !".format(settings["URL"]))
         return
 
     return settings
 
 
-def interrupt(settings, client_id):
-    queue = GET("queue", settings)
+def interrupt(settings, prompt_id, fresh=True):
+    # a cached queue is enough to know that a finished prompt is no longer there
+    snapshot = get_snapshot(settings, max_age=0 if fresh else None)
+    queue = snapshot["queue"]
     if not queue:
         return
 
-    def find_prompt_id(queue_list):
-        return next(
-            (r[1] for r in queue_list if r[3].get("client_id") == client_id), ""
-        )
+    def find_prompt(queue_list):
+        return any(r[1] == prompt_id for r in queue_list)
 
-    prompt_id = find_prompt_id(queue["queue_running"])
-    endpoint = "interrupt" if prompt_id else "queue"
+    running = find_prompt(queue["queue_running"])
+    found = running or find_prompt(queue["queue_pending"])
 
-    if not prompt_id:
-        prompt_id = find_prompt_id(queue["queue_pending"])
+    if found and not fresh:
+        return interrupt(settings, prompt_id, fresh=True)
 
-    if prompt_id:
-        error = POST(endpoint, {"delete": [prompt_id]}, settings)
+    if found:
+        response = client.run_sync(client.interrupt(prompt_id, settings, running))
+        error = read_post_response(response)
         if error:
             show_message(error)
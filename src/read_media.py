@@ -10,7 +10,7 @@ import nuke  # type: ignore
 from ..nuke_util.media_util import get_padding, get_name_no_padding
 from ..nuke_util.nuke_util import get_output_nodes
 from .nodes import get_connected_comfyui_nodes, get_input
-from .common import get_date_code
+from .common import get_date_code, clear_override_nodes
 from .upload_and_download import download_images
 from .update_menu import normalize_nodename
 
@@ -386,6 +386,7 @@ def create_read(run_node, data, settings, filename, already_exists=False):
     for i, onode in get_output_nodes(comfyui_gizmo):
         onode.setInput(i, read)
 
+    clear_override_nodes()
     return read
 
 
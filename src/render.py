@@ -0,0 +1,132 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import math
+import threading
+import subprocess
+from time import sleep
+from collections import deque
+import nuke  # type: ignore
+
+from ..settings import RENDER_WORKERS, RENDER_MIN_FRAMES
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), "render_worker.py")
+FRAME_TAG = "COMFYUI_FRAME"
+
+
+def get_frame_ranges(frames):
+    # contiguous runs of frames as [first, last]
+    ranges = []
+
+    for frame in sorted(frames):
+        if ranges and frame == ranges[-1][1] + 1:
+            ranges[-1][1] = frame
+        else:
+            ranges.append([frame, frame])
+
+    return ranges
+
+
+def split_frames(frames, workers):
+    # contiguous chunks of about the same size, one per worker
+    frames = sorted(frames)
+    size = int(math.ceil(len(frames) / float(workers)))
+
+    return [frames[i : i + size] for i in range(0, len(frames), size)]
+
+
+def use_workers(frames):
+    if RENDER_WORKERS < 2 or len(frames) < RENDER_MIN_FRAMES:
+        return False
+
+    # the script is copied without renaming the artist's script
+    return hasattr(nuke, "scriptSaveToTemp")
+
+
+def execute(write, frames, settings):
+    if not use_workers(frames):
+        for first, last in get_frame_ranges(frames):
+            nuke.execute(write, first, last)
+        return
+
+    execute_parallel(write, frames, settings)
+
+
+def execute_parallel(write, frames, settings):
+    # each chunk is rendered by a "nuke -t" process against a saved copy of the
+    # script, the workers print every finished frame to report progress
+    render_dir = os.path.join(settings["TEMPORAL_DIR"], "render")
+    if not os.path.isdir(render_dir):
+        os.makedirs(render_dir)
+
+    script = os.path.join(render_dir, "{}.nk".format(write.name()))
+    nuke.scriptSaveToTemp(script)
+
+    task = nuke.ProgressTask("Rendering {}".format(write.name()))
+    task.setMessage("Starting {} workers ...".format(RENDER_WORKERS))
+
+    rendered = [0]
+    output = deque(maxlen=20)
+    lock = threading.Lock()
+
+    def read_output(process):
+        for line in iter(process.stdout.readline, ""):
+            with lock:
+                if line.startswith(FRAME_TAG):
+                    rendered[0] += 1
+                else:
+                    output.append(line.rstrip())
+
+    processes = []
+    threads = []
+
+    for chunk in split_frames(frames, RENDER_WORKERS):
+        ranges = " ".join(
+            "{}:{}".format(first, last) for first, last in get_frame_ranges(chunk)
+        )
+
+        process = subprocess.Popen(
+            [nuke.EXE_PATH, "-t", WORKER_SCRIPT, script, write.fullName(), ranges],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+
+        thread = threading.Thread(target=read_output, args=(process,))
+        thread.daemon = True
+        thread.start()
+
+        processes.append(process)
+        threads.append(thread)
+
+    try:
+        while any(p.poll() is None for p in processes):
+            if task.isCancelled():
+                for p in processes:
+                    p.kill()
+
+                raise RuntimeError("Render of {} cancelled".format(write.name()))
+
+            with lock:
+                done = rendered[0]
+
+            task.setMessage("{} / {} frames".format(done, len(frames)))
+            task.setProgress(int(done * 100 / float(len(frames))))
+            sleep(0.2)
+
+        for thread in threads:
+            thread.join(5)
+
+        if any(p.returncode for p in processes):
+            raise RuntimeError(
+                "Render worker of {} failed:\n{}".format(
+                    write.name(), "\n".join(output)
+                )
+            )
+    finally:
+        del task
+        if os.path.isfile(script):
+            os.remove(script)
@@ -0,0 +1,26 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# Runs inside "nuke -t": render_worker.py <script> <write> "<first>:<last> ..."
+import sys
+import nuke  # type: ignore
+
+
+def main(script, write_name, ranges):
+    nuke.scriptOpen(script)
+    write = nuke.toNode(write_name)
+
+    for frame_range in ranges.split():
+        first, last = [int(f) for f in frame_range.split(":")]
+
+        for frame in range(first, last + 1):
+            nuke.execute(write, frame, frame)
+
+            print("COMFYUI_FRAME {}".format(frame))
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
@@ -8,12 +8,12 @@ import sys
 import nuke  # type: ignore
 import os
 import traceback
-from time import sleep, time
-import websocket
-import json
-import threading
+from time import time
+import uuid
 import copy
+from functools import partial
 
+from ..settings import CANCEL_POLL_INTERVAL
 from ..nuke_util.nuke_util import (
     set_tile_color,
     get_connected_nodes,
@@ -26,9 +26,11 @@ from .common import (
     get_settings,
     show_message,
 )
-from .connection import POST
+from . import client, state_store, input_store
+from .connection import read_post_response
 from .queue_manager import resolve_submission_target, interrupt
-from .nodes import extract_data
+from .scheduler import prompt_models, record_models
+from .nodes import extract_data, get_loader_models
 from .read_media import (
     create_read,
     update_filename_prefix,
@@ -165,7 +167,8 @@ def submit(run_node=None, success_callback=None, force_queue=None):
     run_node.begin()
     settings = get_settings(run_node)
 
-    if not resolve_submission_target(settings, force_queue):
+    get_models = partial(get_loader_models, run_node)
+    if not resolve_submission_target(settings, force_queue, get_models):
         return
 
     update_images_and_mask_inputs(settings)
@@ -181,6 +184,12 @@ def submit(run_node=None, success_callback=None, force_queue=None):
         return
 
     global states
+    if not input_node_changed and not run_node.fullName() in states:
+        # first run of the node in this session, the prompt may have been
+        # generated before the script was reopened
+        if state_store.find(run_node, data, settings):
+            states[run_node.fullName()] = copy.deepcopy(data)
+
     if data == states.get(run_node.fullName(), {}) and not input_node_changed:
         settings["filename_prefix"] = update_filename_prefix(run_node, False)
         filename = resolve_filename(run_node, data, settings, True)
@@ -194,13 +203,20 @@ def submit(run_node=None, success_callback=None, force_queue=None):
 
     global prompt_counter
     prompt_counter += 1
-    client_id = "{}:{}:{}".format(
+    client_label = "{}:{}:{}".format(
         os.path.basename(get_user_path()), get_project_name(), prompt_counter
     ).replace(" ", "-")
 
-    body = {"client_id": client_id, "prompt": data, "extra_data": {}}
+    prompt_id = str(uuid.uuid4())
+    lease_id = prompt_id
+    leased = input_store.lease(settings, lease_id, data)
 
-    url = "{}/ws?clientId={}".format(settings["URL"].replace("http", "ws"), client_id)
+    body = {
+        "client_id": client.get_client_id(settings),
+        "prompt_id": prompt_id,
+        "prompt": data,
+        "extra_data": {"client_label": client_label},
+    }
 
     task_status = {
         "title": "Inferencing",
@@ -211,6 +227,7 @@ def submit(run_node=None, success_callback=None, force_queue=None):
     task[0].setMessage(task_status["message"])
 
     execution_error = [False]
+    finished = client.new_event()
 
     def set_task_progress(progress, message=""):
         if not nuke.GUI:
@@ -226,12 +243,7 @@ def submit(run_node=None, success_callback=None, force_queue=None):
             task[0].setMessage(message)
             task_status["message"] = message
 
-    def on_message(_, message):
-        try:
-            message = json.loads(message)
-        except:
-            return
-
+    def on_message(message):
         data = message.get("data", None)
         type_data = message.get("type", None)
 
@@ -254,6 +266,7 @@ def submit(run_node=None, success_callback=None, force_queue=None):
                     set_task_progress(0, node)
                 else:
                     del task[0]
+                    client.set_event(finished)
 
         elif type_data == "execution_error":
             execution_message = data.get("exception_message")
@@ -268,53 +281,62 @@ def submit(run_node=None, success_callback=None, force_queue=None):
             if task:
                 del task[0]
 
+            client.set_event(finished)
+
             execute_in_main_thread(
                 error_node_style, args=(data.get("node_id"), True, execution_message)
             )
             execute_in_main_thread(show_message, args=(error))
 
-    def on_error(ws, error):
-        ws.close()
+    def on_error(error):
         if task:
             del task[0]
 
-        if "connected" in str(error):
-            return
+        client.set_event(finished)
 
         execution_error[0] = True
         execute_in_main_thread(show_message, args=("error: " + str(error)))
 
-    def progress_task_loop():
+    async def wait_job():
+        # ProgressTask has no cancel callback, so only the cancel button is
+        # sampled, the end of the job wakes this up right away
         cancelled = False
-        while task:
-            if task[0].isCancelled():
-                if nuke.executeInMainThreadWithResult(
-                    lambda: nuke.ask(
-                        "Are you sure? This will stop the ComfyUI inference"
-                    )
-                ):
-                    cancelled = True
-                    break
-                elif task:
-                    task[0] = nuke.ProgressTask(task_status["title"])
-                    task[0].setProgress(task_status["progress"])
-                    task[0].setMessage(task_status["message"])
-
-            sleep(0.1)
-
-        interrupt(settings, client_id)
+        while not await client.wait_event(finished, CANCEL_POLL_INTERVAL):
+            if not task or not task[0].isCancelled():
+                continue
+
+            if await client.in_thread(
+                nuke.executeInMainThreadWithResult,
+                lambda: nuke.ask("Are you sure? This will stop the ComfyUI inference"),
+            ):
+                cancelled = True
+                break
+            elif task:
+                task[0] = nuke.ProgressTask(task_status["title"])
+                task[0].setProgress(task_status["progress"])
+                task[0].setMessage(task_status["message"])
+
+        await client.in_thread(interrupt, settings, prompt_id, fresh=cancelled)
 
         if task:
             del task[0]
 
-        ws.close()
+        unwatch()
+
+        if leased:
+            await client.in_thread(input_store.release, settings, lease_id)
 
         if cancelled:
             return
 
-        filename = resolve_filename(run_node, data, settings)
+        filename = await client.in_thread(resolve_filename, run_node, data, settings)
 
-        execute_in_main_thread(progress_finished, args=(run_node, filename))
+        if nuke.GUI:
+            execute_in_main_thread(progress_finished, args=(run_node, filename))
+        else:
+            # headless there is no main thread to hand it to, on the loop it
+            # would hold the socket and deadlock a submit from the callback
+            await client.in_thread(progress_finished, run_node, filename)
 
     def progress_finished(n, filename):
         try:
@@ -324,6 +346,7 @@ def submit(run_node=None, success_callback=None, force_queue=None):
             if not execution_error[0]:
                 remove_all_error_style(run_node)
                 states[run_node.fullName()] = state_data
+                state_store.save(run_node, state_data, filename, settings)
 
         except:
             if not nuke.GUI:
@@ -331,18 +354,37 @@ def submit(run_node=None, success_callback=None, force_queue=None):
 
             execute_in_main_thread(show_message, args=(traceback.format_exc()))
 
-    headers = ["{}: {}".format(k, v) for k, v in settings["HTTP_HEADER"].items()]
-    ws = websocket.WebSocketApp(
-        url, header=headers, on_message=on_message, on_error=on_error
-    )
+    def report_job_error(job):
+        # in the GUI nothing waits on the job, its errors would go unseen
+        if job.cancelled() or not job.exception():
+            return
+
+        e = job.exception()
+        error = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+        execute_in_main_thread(show_message, args=(error,))
 
-    task_loop = None
+    job = None
     if not settings["BACKGROUND_SUBMIT"]:
-        threading.Thread(target=ws.run_forever).start()
-        task_loop = threading.Thread(target=progress_task_loop)
-        task_loop.start()
+        unwatch = client.watch(settings, prompt_id, on_message, on_error)
+        job = client.run_async(wait_job())
+
+        if nuke.GUI:
+            job.add_done_callback(report_job_error)
+
+    response = client.run_sync(client.prompt(body, settings))
+    error = read_post_response(response)
 
-    error = POST("prompt", body, settings)
+    if job and not error:
+        try:
+            server_prompt_id = response.json().get("prompt_id")
+        except:
+            server_prompt_id = None
+
+        if server_prompt_id and not server_prompt_id == prompt_id:
+            # set first, wait_job reads it as soon as the prompt finishes
+            old_prompt_id = prompt_id
+            prompt_id = server_prompt_id
+            client.rekey(settings, old_prompt_id, prompt_id)
 
     if settings["BACKGROUND_SUBMIT"] and not error:
         show_message(
@@ -356,8 +398,14 @@ def submit(run_node=None, success_callback=None, force_queue=None):
         execution_error[0] = True
         if task:
             del task[0]
+        client.set_event(finished)
         show_message(error)
 
+        if leased and not job:
+            input_store.release(settings, lease_id)
+    else:
+        record_models(settings["URL"], prompt_models(data))
+
     if not nuke.GUI:
-        task_loop.join() if task_loop else None
+        job.result() if job else None
         print("\nPrompt executed in {} seconds".format(round(time() - total_time, 1)))
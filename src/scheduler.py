@@ -0,0 +1,138 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+from .connection import get_base_url
+from ..settings import SERVER_WEIGHTS, MODEL_AFFINITY_TOLERANCE
+
+# nodes in a prompt that count as one extra queued prompt
+PROMPT_NODES_COST = 50.0
+LOADER_INPUTS = ("ckpt_name", "unet_name", "lora_name")
+
+# base_url -> models loaded by the last prompt sent to that server
+resident_models = {}
+affinity_stats = {"hits": 0, "misses": 0}
+
+
+def prompt_cost(queue_item):
+    prompt = queue_item[2] if len(queue_item) > 2 else {}
+    return 1.0 + len(prompt or {}) / PROMPT_NODES_COST
+
+
+def queue_load(queue):
+    if not queue:
+        return 0
+
+    running = sum(prompt_cost(r) for r in queue["queue_running"])
+    pending = sum(prompt_cost(p) for p in queue["queue_pending"])
+
+    return running + pending
+
+
+def device_capacity(system_stats):
+    if not system_stats:
+        return 1.0
+
+    devices = system_stats.get("devices", [])
+    gpus = [d for d in devices if not d.get("type") == "cpu"]
+
+    if not gpus:
+        return 0.1 if devices else 1.0
+
+    vram_free = 0
+    for d in gpus:
+        total = float(d.get("vram_total") or 0)
+        if total:
+            vram_free = max(vram_free, d.get("vram_free", 0) / total)
+
+    return 0.5 + vram_free
+
+
+def server_weight(url):
+    weights = {get_base_url({"URL": u}): w for u, w in SERVER_WEIGHTS.items()}
+    return float(weights.get(get_base_url({"URL": url}), 1.0))
+
+
+def load_score(url, snapshot):
+    capacity = device_capacity(snapshot["system_stats"]) * server_weight(url)
+    return capacity / (1.0 + queue_load(snapshot["queue"]))
+
+
+scorer = load_score
+
+
+def set_scorer(func):
+    # func(url, snapshot) -> float, higher is better
+    global scorer
+    scorer = func or load_score
+
+
+def prompt_models(prompt):
+    models = set()
+
+    for node in prompt.values():
+        for key in LOADER_INPUTS:
+            value = node.get("inputs", {}).get(key)
+            if value and not type(value) == list:
+                models.add(value)
+
+    return models
+
+
+def resident_affinity(url, models):
+    resident = resident_models.get(get_base_url({"URL": url}), set())
+    return len(resident & set(models))
+
+
+def record_models(url, models):
+    if not models:
+        return
+
+    base_url = get_base_url({"URL": url})
+    resident = resident_models.get(base_url, set())
+    missing = set(models) - resident
+
+    if missing:
+        affinity_stats["misses"] += 1
+        print(
+            "ComfyUI model affinity miss on {}: loading {}".format(
+                base_url, ", ".join(sorted(missing))
+            )
+        )
+    else:
+        affinity_stats["hits"] += 1
+        print("ComfyUI model affinity hit on {}".format(base_url))
+
+    resident_models[base_url] = set(models)
+
+
+def rank_servers(snapshots):
+    reachable = [(url, s) for url, s in snapshots if s["queue"]]
+    scores = [(scorer(url, s), -i, url, s) for i, (url, s) in enumerate(reachable)]
+
+    return [(score, url, s) for score, _, url, s in sorted(scores, reverse=True)]
+
+
+def prefer_resident(ranked, models):
+    if not ranked:
+        return ""
+
+    if not models:
+        return ranked[0][1]
+
+    # only servers with a comparable load compete on loaded models
+    best_score = ranked[0][0]
+    comparable = [r for r in ranked if r[0] >= best_score * MODEL_AFFINITY_TOLERANCE]
+    affinities = [resident_affinity(url, models) for _, url, _ in comparable]
+
+    return comparable[affinities.index(max(affinities))][1]
+
+
+def choose_server(snapshots, models=None):
+    ranked = rank_servers(snapshots)
+    if not ranked:
+        return "", None
+
+    idle = [r for r in ranked if not r[2]["queue"]["queue_running"]]
+    return prefer_resident(idle, models), prefer_resident(ranked, models)
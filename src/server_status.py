@@ -0,0 +1,189 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import threading
+from time import time, sleep
+
+from . import metrics
+from .connection import GET, get_base_url, is_available
+from ..settings import (
+    SERVER_STATUS_TTL,
+    SERVER_STATUS_BACKGROUND_REFRESH,
+    SYSTEM_STATS_TTL,
+)
+
+# base_url -> {"queue", "system_stats", "reachable", "time", "accessed", "settings"}
+snapshots = {}
+snapshots_lock = threading.Lock()
+refresh_thread = None
+
+# base_url -> {"system_stats", "time"}, kept apart from the queue because most
+# of it, like the server argv, only changes when the server restarts
+system_stats_cache = {}
+
+
+def get_system_stats(settings, max_age=None, timeout=3, warning=False):
+    max_age = SYSTEM_STATS_TTL if max_age is None else max_age
+    base_url = get_base_url(settings)
+
+    with snapshots_lock:
+        cached = system_stats_cache.get(base_url)
+
+    if cached and time() - cached["time"] <= max_age:
+        return cached["system_stats"]
+
+    system_stats = GET(
+        "system_stats",
+        dict(settings, URL=base_url),
+        warning=warning,
+        timeout=timeout,
+        retries=0,
+    )
+
+    with snapshots_lock:
+        if system_stats:
+            system_stats_cache[base_url] = {
+                "system_stats": system_stats,
+                "time": time(),
+            }
+        else:
+            system_stats_cache.pop(base_url, None)
+
+    return system_stats
+
+
+def invalidate_on_failure(event):
+    # any request that could not reach the server forgets its system_stats
+    if event["status"] is None:
+        with snapshots_lock:
+            system_stats_cache.pop(event["server"], None)
+
+
+def fetch_snapshot(settings, timeout=3):
+    queue = GET("queue", settings, warning=False, timeout=timeout, retries=0)
+    system_stats = None
+
+    if queue:
+        system_stats = get_system_stats(settings, timeout=timeout)
+
+    return {
+        "queue": queue,
+        "system_stats": system_stats,
+        "reachable": bool(queue and system_stats),
+        "time": time(),
+    }
+
+
+def store_snapshot(base_url, snapshot, settings):
+    with snapshots_lock:
+        prev = snapshots.get(base_url, {})
+        snapshot["accessed"] = prev.get("accessed", time())
+        snapshot["settings"] = dict(settings)
+        snapshots[base_url] = snapshot
+
+    return snapshot
+
+
+def refresh_snapshot(settings, timeout=3):
+    base_url = get_base_url(settings)
+    snapshot = fetch_snapshot(dict(settings, URL=base_url), timeout)
+    return store_snapshot(base_url, snapshot, settings)
+
+
+def is_fresh(snapshot, max_age):
+    if not snapshot:
+        return False
+
+    return time() - snapshot["time"] <= max_age
+
+
+def get_snapshots(urls, settings, max_age=None, timeout=3):
+    # stale servers are refreshed in parallel, so the whole pool costs one round-trip
+    max_age = SERVER_STATUS_TTL if max_age is None else max_age
+    results = {}
+    threads = []
+
+    for url in urls:
+        base_url = get_base_url(dict(settings, URL=url))
+
+        with snapshots_lock:
+            snapshot = snapshots.get(base_url)
+            if snapshot:
+                snapshot["accessed"] = time()
+
+        if is_fresh(snapshot, max_age):
+            results[url] = snapshot
+            continue
+
+        # a dead host is skipped until its circuit breaker lets a request through
+        if not is_available(dict(settings, URL=url)):
+            continue
+
+        def refresh(url=url):
+            results[url] = refresh_snapshot(dict(settings, URL=url), timeout)
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    deadline = time() + timeout
+    for thread in threads:
+        thread.join(max(deadline - time(), 0))
+
+    start_background_refresh()
+
+    unreachable = {"queue": None, "system_stats": None, "reachable": False}
+    return [(url, results.get(url, unreachable)) for url in urls]
+
+
+def get_snapshot(settings, max_age=None, timeout=3):
+    return get_snapshots([settings["URL"]], settings, max_age, timeout)[0][1]
+
+
+def invalidate(settings=None):
+    with snapshots_lock:
+        if settings is None:
+            snapshots.clear()
+            system_stats_cache.clear()
+        else:
+            snapshots.pop(get_base_url(settings), None)
+            system_stats_cache.pop(get_base_url(settings), None)
+
+
+def refresh_loop():
+    while True:
+        sleep(SERVER_STATUS_TTL)
+
+        with snapshots_lock:
+            items = list(snapshots.items())
+
+        for base_url, snapshot in items:
+            # only keep refreshing servers that are still being asked for
+            if time() - snapshot["accessed"] > SERVER_STATUS_TTL * 30:
+                continue
+
+            if is_fresh(snapshot, SERVER_STATUS_TTL / 2.0):
+                continue
+
+            refresh_snapshot(snapshot["settings"])
+
+
+def start_background_refresh():
+    global refresh_thread
+
+    if not SERVER_STATUS_BACKGROUND_REFRESH:
+        return
+
+    with snapshots_lock:
+        if refresh_thread and refresh_thread.is_alive():
+            return
+
+        refresh_thread = threading.Thread(target=refresh_loop)
+        refresh_thread.daemon = True
+        refresh_thread.start()
+
+
+metrics.add_hook(invalidate_on_failure)
@@ -0,0 +1,118 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import json
+from time import time
+from importlib import import_module
+from collections import OrderedDict
+
+from ..settings import TEMPORAL_DIR, PROFILE_STARTUP, STARTUP_BUDGET
+
+# step -> seconds spent in it while Nuke starts
+timings = OrderedDict()
+
+
+def profile(name, func, *args, **kwargs):
+    start = time()
+    result = func(*args, **kwargs)
+    timings[name] = time() - start
+
+    return result
+
+
+def get_listing_path():
+    return os.path.join(TEMPORAL_DIR, "nodes_listing.json")
+
+
+def load_listing(nodes_dir):
+    # valid while neither nodes/ nor any of its folders changed their mtime
+    try:
+        with open(get_listing_path()) as f:
+            listing = json.load(f)
+
+        if not listing["nodes_dir"] == nodes_dir:
+            return
+
+        for folder, mtime in listing["mtimes"].items():
+            if not os.stat(folder).st_mtime == mtime:
+                return
+
+        return listing["items"]
+    except:
+        return
+
+
+def save_listing(nodes_dir, mtimes, items):
+    # imported here, common is profiled as its own step of the startup
+    from .common import save_json
+
+    listing = {"nodes_dir": nodes_dir, "mtimes": mtimes, "items": items}
+
+    try:
+        save_json(get_listing_path(), listing)
+    except:
+        pass
+
+
+def list_nodes(nodes_dir):
+    # [menu name, .nk path] of every node under nodes/
+    items = load_listing(nodes_dir)
+    if not items is None:
+        return items
+
+    items = []
+    mtimes = {nodes_dir: os.stat(nodes_dir).st_mtime}
+
+    for dirname in os.listdir(nodes_dir):
+        folder = os.path.join(nodes_dir, dirname)
+
+        if not os.path.isdir(folder):
+            continue
+
+        mtimes[folder] = os.stat(folder).st_mtime
+
+        for nk in os.listdir(folder):
+            if not nk.split(".")[-1] == "nk":
+                continue
+
+            name = "{}/{}".format(
+                "Basic Nodes" if dirname == "ComfyUI" else dirname, nk.split(".")[0]
+            )
+            items.append([name, os.path.join(folder, nk)])
+
+    save_listing(nodes_dir, mtimes, items)
+    return items
+
+
+def profile_imports(modules):
+    # modules already imported during setup cost nothing here,
+    # the rest is what their first use will cost later
+    for name in modules:
+        profile("import src.{}".format(name), import_module, "." + name, __package__)
+
+
+def report():
+    print("ComfyUI startup profile:")
+    for name, seconds in timings.items():
+        print("    {:<40} {:8.1f} ms".format(name, seconds * 1000))
+
+    startup = timings.get("import", 0) + timings.get("setup", 0)
+    print("    import + setup: {:.1f} ms".format(startup * 1000))
+
+    if startup > STARTUP_BUDGET:
+        print(
+            "    over the startup budget of {:.1f} ms !".format(STARTUP_BUDGET * 1000)
+        )
+
+    return startup
+
+
+def finish(modules):
+    if not PROFILE_STARTUP:
+        return
+
+    profile_imports(modules)
+    report()
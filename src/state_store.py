@@ -0,0 +1,123 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+import os
+import json
+from time import time
+
+from ..settings import STATE_STORE_MAX_ENTRIES
+from .fingerprint import md5
+from .input_store import get_location, load_index, locked_index
+
+# index file under TEMPORAL_DIR, read and written like the input store index
+INDEX = "states"
+
+# Prompt of the last successful generation of every Run node, so reopening the
+# script does not submit an identical prompt again. Only digests are stored, the
+# entry checksum discards a damaged entry and the output files must still be on
+# disk with the same size.
+#
+# index: "<script>:<node fullName>" -> {"digest", "filename", "files",
+#                                       "accessed", "checksum"}
+
+
+def get_entry_key(run_node, settings):
+    # every untitled script is called "Root", they can not be told apart
+    if settings["project_name"] == "Root":
+        return
+
+    return "{}:{}".format(settings["project_name"], run_node.fullName())
+
+
+def get_digest(data, settings):
+    # the same prompt on another ComfyUI does not have the outputs
+    return md5(json.dumps([data, get_location(settings)], sort_keys=True))
+
+
+def get_checksum(entry):
+    fields = [entry["digest"], entry["filename"], entry["files"], entry["accessed"]]
+    return md5(json.dumps(fields, sort_keys=True))
+
+
+def get_output_files(filename):
+    # size of every file of the generation, its directory belongs to the run,
+    # the file name of a sequence ends with its frame range
+    output_dir = os.path.dirname(filename)
+    if not os.path.isdir(output_dir):
+        return {}
+
+    files = {}
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        if os.path.isfile(path):
+            files[name] = os.path.getsize(path)
+
+    return files
+
+
+def is_valid(entry):
+    try:
+        if not entry["checksum"] == get_checksum(entry):
+            return False
+    except:
+        return False
+
+    output_dir = os.path.dirname(entry["filename"])
+
+    for name, size in entry["files"].items():
+        path = os.path.join(output_dir, name)
+        if not os.path.isfile(path) or not os.path.getsize(path) == size:
+            return False
+
+    return bool(entry["files"])
+
+
+def find(run_node, data, settings):
+    entry_key = get_entry_key(run_node, settings)
+    if not entry_key:
+        return False
+
+    entry = load_index(settings, INDEX)["entries"].get(entry_key)
+    if not entry:
+        return False
+
+    if not entry.get("digest") == get_digest(data, settings):
+        return False
+
+    if not is_valid(entry):
+        # unless another session saved a new one meanwhile
+        with locked_index(settings, INDEX) as index:
+            if index["entries"].get(entry_key) == entry:
+                del index["entries"][entry_key]
+
+        return False
+
+    return True
+
+
+def save(run_node, data, filename, settings):
+    entry_key = get_entry_key(run_node, settings)
+    if not entry_key or not filename:
+        return
+
+    entry = {
+        "digest": get_digest(data, settings),
+        "filename": filename,
+        "files": get_output_files(filename),
+        "accessed": time(),
+    }
+    entry["checksum"] = get_checksum(entry)
+
+    with locked_index(settings, INDEX) as index:
+        entries = index["entries"]
+        entries[entry_key] = entry
+
+        # least recently generated first
+        if len(entries) > STATE_STORE_MAX_ENTRIES:
+            ordered = sorted(
+                entries.items(), key=lambda item: item[1].get("accessed", 0)
+            )
+            for key, _ in ordered[: len(entries) - STATE_STORE_MAX_ENTRIES]:
+                del entries[key]
@@ -5,17 +5,21 @@
 # WEBSITE -------> https://vinavfx.com
 # -----------------------------------------------------------
 from functools import partial
+from collections import OrderedDict
 import re
 import json
+import threading
 import nuke  # type: ignore
 
 from ..nuke_util.nuke_util import set_tile_color, get_output_nodes
-from .connection import GET, convert_to_utf8
 from ..settings import COMFYUI2NUKE
-from .common import get_settings, show_message
+from .common import get_settings, show_message, clear_override_nodes
+from . import catalog
 
-comfyui_nodes = {}
 menu_updated = False
+menu_state = {"generation": 0, "populated": 0}
+# menu path -> (class_type, catalog hash) of every command in the menu
+menu_entries = {}
 
 
 def normalize_nodename(name):
@@ -30,14 +34,14 @@ def normalize_nodename(name):
 
 
 def get_nodes():
-    if not comfyui_nodes:
+    if not catalog.nodes:
         update()
 
-    return comfyui_nodes
+    return catalog.nodes
 
 
 def create_comfyui_node(node_type, inpanel=True):
-    node_data = comfyui_nodes.get(node_type)
+    node_data = catalog.nodes.get(node_type)
     if not node_data:
         return
 
@@ -45,11 +49,17 @@ def create_comfyui_node(node_type, inpanel=True):
 
 
 def refresh_models(node, knob_name, class_type):
-    update()
-    nodes = get_nodes()
+    # only the class being refreshed is downloaded and patched into the catalog
+    settings = get_settings()
+    info, _ = catalog.fetch_object_info(settings, class_type=class_type)
+    if not info or not class_type in info:
+        return
+
+    value = catalog.patch_entry(class_type, info[class_type])
+    catalog.patch_cached(settings, class_type, info[class_type])
 
     knob = node.knob(knob_name)
-    _knob = nodes[class_type]["input"]["required"][knob_name[:-1]]
+    _knob = value["input"]["required"][knob_name[:-1]]
     models = _knob[0]
 
     if models == "COMBO":
@@ -109,7 +119,7 @@ def create_node(data, inpanel=True):
         _class = _input[0]
         info = _input[1] if len(_input) == 2 else {}
 
-        if not type(info) == dict:
+        if not isinstance(info, dict):
             continue
 
         tooltip = info.get("tooltip", "")
@@ -263,6 +273,8 @@ def create_node(data, inpanel=True):
         for i, onode in get_output_nodes(selected_node):
             onode.setInput(i, n)
 
+        clear_override_nodes()
+
     if "ShowText" in name:
         show_knob = nuke.Multiline_Eval_String_Knob("text", "")
         n.addKnob(show_knob)
@@ -286,20 +298,116 @@ def update_menu():
     return update()
 
 
-def update():
-    global menu_updated
+def revalidate_catalog(settings, fingerprint):
+    def apply(info, fingerprint):
+        catalog.set_info(info, fingerprint, validated=True)
+        build_menu()
+
+    def revalidate():
+        info, new_fingerprint = catalog.fetch_object_info(settings, warning=False)
+        if not info:
+            return
+
+        if new_fingerprint == fingerprint:
+            catalog.state["validated"] = True
+            return
+
+        catalog.save_cached(settings, info, new_fingerprint)
+        nuke.executeInMainThread(apply, args=(info, new_fingerprint))
+
+    thread = threading.Thread(target=revalidate)
+    thread.daemon = True
+    thread.start()
+
+
+def update(use_cache=False, background=True):
+    # with use_cache the menu is built from the last catalog saved on disk
+    # and the server is checked in the background
+    settings = get_settings()
+
+    if use_cache:
+        info, fingerprint = catalog.load_cached(settings)
+
+        if info:
+            catalog.set_info(info, fingerprint)
+            build_menu(background=background)
+            revalidate_catalog(settings, fingerprint)
+            return True
+
     progress = nuke.ProgressTask("Updating ComfyUI")
     progress.setMessage("Loading data from server...")
     progress.setProgress(0)
 
-    info = GET("object_info", get_settings())
+    info, fingerprint = catalog.fetch_object_info(settings)
     if not info:
         return
 
+    catalog.save_cached(settings, info, fingerprint)
+    catalog.set_info(info, fingerprint, validated=True)
+
+    return build_menu(progress, background)
+
+
+def build_menu(progress=None, background=True):
+    # only the commands whose menu path or catalog entry changed since the
+    # last build are touched, the submenus are filled one category at a time
+    # from a background thread so the main thread is only held briefly
+    global menu_updated
     menu_updated = True
+    menu_state["generation"] += 1
 
     comfyui_menu = nuke.menu("Nodes").addMenu("ComfyUI")
 
+    if not menu_entries:
+        clear_menu(comfyui_menu)
+
+    load_exr_exist = any(
+        name.replace("+", "") == "LoadEXR" for name in catalog.nodes
+    )
+
+    if not load_exr_exist:
+        show_message("ComfyUI-HQ-Image-Save module is required !")
+
+    if progress:
+        del progress
+
+    # nodes are still created through the catalog, a menu is not needed on farm
+    if not nuke.GUI:
+        return True
+
+    entries = {}
+    for fullname, class_type in catalog.menu_items.items():
+        entries[fullname] = (class_type, catalog.hashes.get(class_type))
+
+    for fullname in sorted(set(menu_entries) - set(entries), reverse=True):
+        remove_command(comfyui_menu, fullname)
+        del menu_entries[fullname]
+
+    categories = OrderedDict()
+    for fullname, entry in sorted(entries.items()):
+        if menu_entries.get(fullname) == entry:
+            continue
+
+        category = fullname.rsplit("/", 1)[0]
+        categories.setdefault(category, []).append((fullname, entry))
+
+    if not background:
+        for items in categories.values():
+            populate_category(menu_state["generation"], items)
+
+        menu_state["populated"] = menu_state["generation"]
+        return True
+
+    thread = threading.Thread(
+        target=populate_menu, args=(menu_state["generation"], categories)
+    )
+    thread.daemon = True
+    thread.start()
+
+    return True
+
+
+def clear_menu(comfyui_menu):
     for item in comfyui_menu.items():
         if item.name() in ["Update all ComfyUI", "Basic Nodes", "Gizmos", "Scripts"]:
             continue
@@ -308,59 +416,49 @@ def update():
             continue
         item.clearMenu()
 
-    load_exr_exist = False
-    nodes = {}
-
-    def normalize_string(string):
-        if not string:
-            return ""
+    menu_entries.clear()
 
-        string = "".join(char if ord(char) < 128 else "" for char in string)
-        return string.replace(" /", "/").replace("/ ", "/").strip()
 
-    for _, value in info.items():
-        name = value["name"].replace("+", "")
+def remove_command(comfyui_menu, fullname):
+    # the command and then every submenu it leaves empty
+    path, _, name = fullname.rpartition("/")
 
-        if name == "LoadEXR":
-            load_exr_exist = True
+    while name:
+        menu = comfyui_menu.findItem(path) if path else comfyui_menu
+        if not menu:
+            return
 
-        value["display_name"] = value.get("display_name") or value.get("name")
-        display_name = normalize_string(value["display_name"])
-        category = normalize_string(value["category"])
+        menu.removeItem(name)
 
-        if not category:
-            category = "Uncategorized"
+        if not path or menu.items():
+            return
 
-        value["category"] = category
+        path, _, name = path.rpartition("/")
 
-        item_name = "{}/{}".format(category, display_name)
-        nodes[item_name] = value
 
-    if not load_exr_exist:
-        show_message("ComfyUI-HQ-Image-Save module is required !")
+def populate_category(generation, items):
+    # a newer build_menu cancels the categories still pending
+    if not generation == menu_state["generation"]:
+        return False
 
+    comfyui_menu = nuke.menu("Nodes").addMenu("ComfyUI")
     icon_gray = "{}/icons/comfyui_icon_gray.png".format(COMFYUI2NUKE)
-    progress.setMessage("Refreshing menu items...")
-
-    for i, (fullname, value) in enumerate(sorted(nodes.items())):
-        progress.setProgress(int(i * 100 / len(nodes)))
 
-        input_data = value.get("input", {})
-        input_order = value.get("input_order", {})
-
-        if not input_order:
-            value["input_order"] = {
-                "required": list(input_data.get("required", {})),
-                "optional": list(input_data.get("optional", {})),
-            }
-
-        value = json.loads(json.dumps(value))  # OrderedDict to Dict
-        value_utf8 = convert_to_utf8(value)
-
-        comfyui_nodes[value["name"]] = value_utf8
+    # addCommand replaces a command that already exists on the same path
+    for fullname, entry in items:
         comfyui_menu.addCommand(
-            fullname, partial(create_node, value_utf8), "", icon_gray
+            fullname, partial(create_comfyui_node, entry[0]), "", icon_gray
         )
+        menu_entries[fullname] = entry
 
-    del progress
     return True
+
+
+def populate_menu(generation, categories):
+    for items in categories.values():
+        if not nuke.executeInMainThreadWithResult(
+            populate_category, args=(generation, items)
+        ):
+            return
+
+    menu_state["populated"] = generation
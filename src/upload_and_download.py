@@ -6,33 +6,30 @@
 import os
 import nuke  # type: ignore
 import shutil
-import requests
 
-from .common import get_comfyui_dir, get_settings
+from .common import get_comfyui_dir, get_settings, show_message
+from . import client
+from ..settings import HTTP_POOL_SIZE
 
 
-def upload_images(folder, settings):
+def upload_images(folder, settings, files=None):
     task = nuke.ProgressTask("Uploading to ComfyUI")
 
-    url = "{}/upload/image".format(settings["URL"])
-    results = []
-    files = os.listdir(folder)
+    subfolder = os.path.basename(folder)
+    files = os.listdir(folder) if files is None else files
     total = len(files)
+    results = [None] * total
 
-    for i, file in enumerate(files):
-        image_path = os.path.join(folder, file)
+    uploads = [
+        client.upload(os.path.join(folder, file), subfolder, settings)
+        for file in files
+    ]
 
-        with open(image_path, "rb") as f:
-            files = {"image": f}
-            data = {"subfolder": os.path.basename(folder), "overwrite": "true"}
+    for done, (i, result) in enumerate(client.transfer(uploads)):
+        results[i] = result
 
-            resp = requests.post(
-                url, headers=settings["HTTP_HEADER"], files=files, data=data
-            )
-            results.append((resp.status_code, resp.text))
-
-        task.setMessage("Uploading: " + file)
-        task.setProgress(int((i / float(total)) * 100))
+        task.setMessage("Uploading: " + files[i])
+        task.setProgress(int((done / float(total)) * 100))
 
     task.setProgress(100)
 
@@ -71,35 +68,51 @@ def download_images(separated_filename, dst_folder, frange, settings, run_node):
     total = frange[1] - frange[0] + 1
     downloaded = 0
 
-    for i in range(1, 10000):
-        image = "{}_{}_.{}".format(basename, str(i).zfill(5), ext)
+    # the expected range is requested at once, then the rest in small batches
+    # until a frame is missing
+    first = 1
+    batch_size = max(total, 1)
 
-        url = "{}/api/view?filename={}&subfolder={}".format(
-            settings["URL"], image, subfolder
-        )
+    while first < 10000 and last_frame == first - 1:
+        frames = list(range(first, min(first + batch_size, 10000)))
+        images = ["{}_{}_.{}".format(basename, str(i).zfill(5), ext) for i in frames]
 
-        r = requests.get(url, headers=settings["HTTP_HEADER"], stream=True)
+        views = [
+            client.view(image, subfolder, os.path.join(output, image), settings)
+            for image in images
+        ]
 
-        if r.status_code != 200:
-            last_frame = i - 1
-            break
+        exists = {}
+        try:
+            for index, result in client.transfer(views):
+                if task.isCancelled():
+                    return
 
-        if task.isCancelled():
-            return
+                exists[frames[index]] = result
+                if not result:
+                    continue
+
+                downloaded += 1
 
-        dst_path = os.path.join(output, image)
+                task.setMessage("Downloading: " + images[index])
+                task.setProgress(int((downloaded / float(total)) * 100))
+
+        except Exception as e:
+            # a failed frame is not the end of the sequence
+            nuke.executeInMainThread(
+                show_message, args=("Error downloading from ComfyUI: {}".format(e),)
+            )
+            return
 
-        with open(dst_path, "wb") as f:
-            for chunk in r.iter_content(8192):
-                f.write(chunk)
-        downloaded += 1
+        while exists.get(last_frame + 1):
+            last_frame += 1
 
-        task.setMessage("Downloading: " + image)
-        task.setProgress(int((i / float(total)) * 100))
+        first += batch_size
+        batch_size = HTTP_POOL_SIZE
 
     task.setProgress(100)
 
-    if not downloaded:
+    if not last_frame:
         return
 
     return "{}/{}_#####_.{} 1-{}".format(output, basename, ext, last_frame)
@@ -12,7 +12,7 @@ from .update_menu import create_comfyui_node, normalize_nodename, update_menu
 from .run import error_node_style
 from .nodes import get_node_data
 from .connection import convert_to_utf8
-from .common import show_message
+from .common import show_message, clear_override_nodes
 from ..settings import COMFYUI2NUKE
 from .scripts.knob2input import convert_knobs
 
@@ -222,6 +222,7 @@ def import_workflow():
             nodes.append(run_node)
 
     [n.setSelected(True) for n in nodes]
+    clear_override_nodes()
 
     if not_installed:
         nodes_list = "\n".join(not_installed)
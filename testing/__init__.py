@@ -1 +1 @@
-from . import testing
+from . import testing, scheduler_simulation
@@ -0,0 +1,168 @@
+# -----------------------------------------------------------
+# AUTHOR --------> Francisco Contreras
+# OFFICE --------> Senior VFX Compositor, Software Developer
+# WEBSITE -------> https://vinavfx.com
+# -----------------------------------------------------------
+# Replays recorded server snapshots to compare the scoring scheduler with the
+# pending-count heuristic. The wait of a job is measured with the prompt
+# durations each server recorded in /history, not with the scheduler's own
+# cost model, so the comparison does not favor the scoring policy by design.
+
+
+def get_durations(history):
+    # seconds from execution_start to execution_success of every finished prompt
+    durations = []
+
+    for item in (history or {}).values():
+        status = item.get("status") or {}
+        if not status.get("status_str") == "success":
+            continue
+
+        timestamps = {}
+        for name, data in status.get("messages", []):
+            timestamps[name] = data.get("timestamp")
+
+        start = timestamps.get("execution_start")
+        end = timestamps.get("execution_success")
+
+        if start and end and end > start:
+            durations.append((end - start) / 1000.0)
+
+    return durations
+
+
+def record_server_snapshots(filepath, count=60, interval=5, history_items=64):
+    import json
+    from time import sleep
+    from ..src.common import get_settings
+    from ..src.connection import GET
+    from ..src.server_status import get_snapshots
+
+    settings = get_settings()
+    url = settings["URL"]
+    urls = json.loads(url) if url.strip().startswith("[") else [url]
+
+    records = []
+    for _ in range(count):
+        snapshots = get_snapshots(urls, settings, max_age=0)
+        records.append(
+            [
+                [u, {"queue": s["queue"], "system_stats": s["system_stats"]}]
+                for u, s in snapshots
+            ]
+        )
+        sleep(interval)
+
+    durations = {}
+    for u in urls:
+        endpoint = "history?max_items={}".format(history_items)
+        history = GET(endpoint, dict(settings, URL=u), warning=False)
+        durations[u] = get_durations(history)
+
+    with open(filepath, "w") as f:
+        json.dump(
+            {"interval": interval, "durations": durations, "snapshots": records}, f
+        )
+
+    return filepath
+
+
+def pending_heuristic(snapshots):
+    reachable = [(url, s) for url, s in snapshots if s["queue"]]
+    for url, s in reachable:
+        if not s["queue"]["queue_running"]:
+            return url
+
+    return min(reachable, key=lambda r: len(r[1]["queue"]["queue_pending"]))[0]
+
+
+def scoring_scheduler(snapshots):
+    from ..src import scheduler
+
+    idle_url, best_url = scheduler.choose_server(snapshots)
+    return idle_url or best_url
+
+
+def replay(recording, choose):
+    # every step submits one job, the chosen server has to finish the prompts
+    # it already had plus the simulated jobs still in its queue before it
+    interval = recording["interval"]
+    durations = recording["durations"]
+
+    mean_duration = {
+        url: sum(d) / len(d) if d else 0.0 for url, d in durations.items()
+    }
+    submitted = {}
+    backlog = {}
+    waits = []
+
+    def service_time(url):
+        # the recorded durations are replayed in order, cycling when exhausted
+        d = durations.get(url) or [mean_duration.get(url, 0.0)]
+        return d[submitted.get(url, 0) % len(d)]
+
+    for record in recording["snapshots"]:
+        snapshots = []
+        for url, s in record:
+            queue = s["queue"]
+            if queue:
+                simulated = [[0, "", {}, {"client_id": ""}]] * len(
+                    backlog.get(url, [])
+                )
+                queue = dict(queue, queue_pending=queue["queue_pending"] + simulated)
+
+            snapshots.append((url, {"queue": queue, "system_stats": s["system_stats"]}))
+
+        if any(s["queue"] for _, s in snapshots):
+            url = choose(snapshots)
+            queue = dict(record)[url]["queue"]
+            recorded = len(queue["queue_running"]) + len(queue["queue_pending"])
+
+            waits.append(
+                recorded * mean_duration.get(url, 0.0) + sum(backlog.get(url, []))
+            )
+
+            backlog.setdefault(url, []).append(service_time(url))
+            submitted[url] = submitted.get(url, 0) + 1
+
+        # every server works through its simulated jobs until the next step
+        for url, jobs in backlog.items():
+            remaining = interval
+            while jobs and remaining > 0:
+                done = min(jobs[0], remaining)
+                jobs[0] -= done
+                remaining -= done
+                if jobs[0] <= 0:
+                    jobs.pop(0)
+
+    waits = sorted(waits)
+    if not waits:
+        return {"jobs": 0, "mean": 0, "p95": 0, "max": 0}
+
+    return {
+        "jobs": len(waits),
+        "mean": round(sum(waits) / len(waits), 3),
+        "p95": round(waits[max(int(len(waits) * 0.95) - 1, 0)], 3),
+        "max": round(waits[-1], 3),
+    }
+
+
+def simulate_scheduler(recording_file):
+    import json
+
+    with open(recording_file) as f:
+        recording = json.load(f)
+
+    result = {
+        "pending_heuristic": replay(recording, pending_heuristic),
+        "scoring_scheduler": replay(recording, scoring_scheduler),
+    }
+
+    for name, stats in result.items():
+        print(
+            "{}: {} jobs, wait mean {}s / p95 {}s / max {}s".format(
+                name, stats["jobs"], stats["mean"], stats["p95"], stats["max"]
+            )
+        )
+
+    return result
@@ -50,3 +50,301 @@ def status_diff(a, b):
     fwrite(file, info)
     if nuke.ask("diff -> {}, open?".format(file)):
         os.system("pluma {}".format(file))
+
+
+def benchmark_menu_startup():
+    # cold: catalog downloaded from the server, warm: built from the disk cache
+    from time import time
+    from ..src import update_menu, catalog
+    from ..src.common import get_settings
+
+    cache = catalog.get_catalog_path(get_settings())
+    if os.path.isfile(cache):
+        os.remove(cache)
+
+    start = time()
+    update_menu.update(use_cache=True)
+    cold = time() - start
+
+    start = time()
+    update_menu.update(use_cache=True)
+    warm = time() - start
+
+    print("menu startup cold: {:.3f}s, warm: {:.3f}s".format(cold, warm))
+    return {"cold": cold, "warm": warm}
+
+
+def get_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024.0**2
+    except:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def benchmark_menu_refresh(repeat=3):
+    # time until every category is in the menu, and the memory it leaves behind
+    from time import time
+    from ..src import update_menu
+
+    rss_before = get_rss_mb()
+    times = []
+
+    for _ in range(repeat):
+        start = time()
+        update_menu.update(use_cache=True, background=False)
+        times.append(time() - start)
+
+    result = {
+        "refresh": min(times),
+        "rss_mb": round(get_rss_mb(), 1),
+        "rss_delta_mb": round(get_rss_mb() - rss_before, 1),
+    }
+
+    print(
+        "menu refresh: {:.3f}s, rss: {} MB ({:+} MB)".format(
+            result["refresh"], result["rss_mb"], result["rss_delta_mb"]
+        )
+    )
+    return result
+
+
+def benchmark_menu_diff():
+    # full rebuild against a refresh where the catalog did not change
+    from time import time
+    from ..src import update_menu
+
+    update_menu.menu_entries.clear()
+
+    start = time()
+    update_menu.build_menu(background=False)
+    full = time() - start
+
+    start = time()
+    update_menu.build_menu(background=False)
+    incremental = time() - start
+
+    print(
+        "menu {} commands, full: {:.3f}s, incremental: {:.3f}s".format(
+            len(update_menu.menu_entries), full, incremental
+        )
+    )
+    return {"full": full, "incremental": incremental}
+
+
+def record_object_info(filepath):
+    import json
+    from ..src import catalog
+    from ..src.common import get_settings
+
+    info, _ = catalog.fetch_object_info(get_settings())
+    if not info:
+        return
+
+    with open(filepath, "w") as f:
+        json.dump(info, f)
+
+    return filepath
+
+
+def benchmark_catalog_normalize(object_info_file=None, repeat=5):
+    # compares the old json round-trip + convert_to_utf8 with catalog.normalize_entry
+    # on a recorded object_info, the server cache is used when no file is given
+    import json
+    from time import time
+    from ..src import catalog
+    from ..src.connection import convert_to_utf8
+    from ..src.common import get_settings
+
+    if object_info_file:
+        with open(object_info_file) as f:
+            raw = f.read()
+    else:
+        with open(catalog.get_catalog_path(get_settings())) as f:
+            raw = json.dumps(json.load(f)["info"])
+
+    def legacy(value):
+        value = json.loads(json.dumps(value))
+        return convert_to_utf8(value)
+
+    def run(normalize):
+        best = None
+        for _ in range(repeat):
+            info = json.loads(raw)
+
+            start = time()
+            for value in info.values():
+                normalize(value)
+            elapsed = time() - start
+
+            best = elapsed if best is None else min(best, elapsed)
+
+        return best
+
+    result = {
+        "entries": len(json.loads(raw)),
+        "legacy": run(legacy),
+        "single_pass": run(catalog.normalize_entry),
+    }
+
+    print(
+        "{} entries, json round-trip + convert_to_utf8: {:.4f}s, "
+        "single pass: {:.4f}s".format(
+            result["entries"], result["legacy"], result["single_pass"]
+        )
+    )
+    return result
+
+
+def benchmark_node_data(count=300, repeat=3):
+    # chain of synthetic ComfyUI nodes, every lookup parsing the data knob
+    # against the cache in nodes.get_node_data
+    import json
+    from time import time
+    from ..src import nodes
+
+    data = {
+        "knobs_order": ["seed_", "steps_", "cfg_"],
+        "knobs_class": {"seed_": "int", "steps_": "int", "cfg_": "float"},
+        "class_type": "KSampler",
+        "output_name": ["LATENT"],
+        "output_node": False,
+        "inputs": [
+            {"name": "model", "outputs": ["model"], "opt": False},
+            {"name": "latent_image", "outputs": ["latent"], "opt": False},
+        ],
+        "outputs": ["latent"],
+    }
+    value = json.dumps(data, indent=4).replace('"', "'")
+
+    graph = []
+    for i in range(count):
+        n = nuke.nodes.NoOp(name="benchmark_node_data_{}".format(i))
+        knob = nuke.PyScript_Knob("data")
+        knob.setValue(value)
+        n.addKnob(knob)
+
+        if graph:
+            n.setInput(0, graph[-1])
+        graph.append(n)
+
+    def run(lookup):
+        best = None
+        for _ in range(repeat):
+            start = time()
+            for n in graph:
+                # check_node, extract_node_data and get_output_index each
+                # read the node and its inputs
+                for _ in range(4):
+                    lookup(n)
+                    lookup(n.input(0)) if n.input(0) else None
+            elapsed = time() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        return best
+
+    uncached = run(lambda n: nodes.parse_node_data(n.knob("data").value()))
+    nodes.node_data_cache.clear()
+    cached = run(nodes.get_node_data)
+
+    for n in graph:
+        nuke.delete(n)
+
+    print(
+        "{} nodes, parsing every lookup: {:.4f}s, cached: {:.4f}s".format(
+            count, uncached, cached
+        )
+    )
+    return {"uncached": uncached, "cached": cached}
+
+
+def legacy_upstream_state(connected_nodes):
+    # the concatenated knob scripts used before fingerprint.get_upstream_state
+    state = ""
+    knobs_ignore = ["old_message", "old_expression_markers"]
+
+    for n in connected_nodes:
+        node_state = ""
+
+        for k in n.knobs().values():
+            if not k.visible() or not k.enabled():
+                continue
+
+            if k.name() in knobs_ignore:
+                continue
+
+            if k.hasExpression() or k.isAnimated():
+                try:
+                    value = k.valueAt(0)
+                except:
+                    value = k.toScript()
+            else:
+                value = k.toScript()
+
+            node_state += "{} ".format(value)
+
+        node_state = node_state.replace(str(n.xpos()), "").replace(str(n.ypos()), "")
+        state += node_state
+
+    return state.strip()
+
+
+def benchmark_fingerprint(count=1000, frames=100):
+    # upstream tree of Grades merged in pairs over a Constant, the string state
+    # against the Merkle digest, cold and with the per node hashes cached
+    from time import time
+    from ..src import fingerprint
+
+    created = [nuke.nodes.Constant()]
+    branches = [created[0]]
+
+    for i in range(count - 1):
+        if i % 10 == 9 and len(branches) > 1:
+            n = nuke.nodes.Merge2()
+            n.setInput(0, branches.pop())
+            n.setInput(1, branches.pop())
+        else:
+            n = nuke.nodes.Grade()
+            n.setInput(0, branches.pop() if i % 4 else branches[-1])
+            n.knob("white").setValue(1 + i * 0.001)
+
+        created.append(n)
+        branches.append(n)
+
+    node = created[-1]
+    frame_list = list(range(1, frames + 1))
+    upstream = created
+
+    start = time()
+    state = legacy_upstream_state(upstream)
+    legacy = time() - start
+
+    fingerprint.clear()
+    start = time()
+    fingerprint.get_upstream_state(node, frame_list)
+    cold = time() - start
+
+    start = time()
+    fingerprint.get_upstream_state(node, frame_list)
+    warm = time() - start
+
+    for n in created:
+        nuke.delete(n)
+
+    result = {
+        "legacy": legacy,
+        "legacy_kb": len(state) / 1024.0,
+        "cold": cold,
+        "warm": warm,
+    }
+
+    print(
+        "{} nodes, string state: {:.3f}s ({:.0f} KB), "
+        "digest cold: {:.3f}s, cached: {:.3f}s".format(
+            count, legacy, result["legacy_kb"], cold, warm
+        )
+    )
+    return result
@@ -0,0 +1,35 @@
+# Runs inside Nuke's python with a recording made by
+# testing.scheduler_simulation.record_server_snapshots:
+#
+#   NUKE_COMFYUI_SCHEDULER_RECORDING=/path/recording.json python -m pytest tests
+import os
+import sys
+from importlib import import_module
+
+import pytest
+
+RECORDING = os.getenv("NUKE_COMFYUI_SCHEDULER_RECORDING")
+
+
+def load_simulation():
+    pytest.importorskip("nuke")
+    pytest.importorskip("requests")
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.dirname(root))
+
+    package = import_module(os.path.basename(root))
+    return import_module(package.__name__ + ".testing.scheduler_simulation")
+
+
+@pytest.mark.skipif(not RECORDING, reason="no scheduler recording given")
+def test_scoring_scheduler_waits_less_than_pending_heuristic():
+    simulation = load_simulation()
+    result = simulation.simulate_scheduler(RECORDING)
+
+    heuristic = result["pending_heuristic"]
+    scoring = result["scoring_scheduler"]
+
+    assert scoring["jobs"] == heuristic["jobs"] > 0
+    assert scoring["mean"] <= heuristic["mean"]
+    assert scoring["p95"] <= heuristic["p95"]